@@ -1,76 +1,41 @@
 from chesslib import board
+from chesslib import users
 from chesslib.gui_tkinter import display
 from tkinter import *
 from tkinter.messagebox import showwarning, showinfo
-import json
-import base64
+import os
 
 
-try:
-    file = open("db_test.json", "x+")
-except FileExistsError:
-    file = open("db_test.json", "a+")
-    flag = True
+USERS_JSON = "db_test.json"  # the old user file, moved into the store on first run
+GAMES_RECORD = "games.clgr"  # every game played is appended here, see chesslib/record.py
+
+user_store = users.SQLiteUserStore(users.DEFAULT_DATABASE)
+if os.path.exists(USERS_JSON):
+    users.migrate_json(user_store, USERS_JSON)
 
 
 def register():
     user_login = entry_register_name.get()
     user_password = entry_register_password.get()
 
-    with open("db_test.json", "r") as read_file:
-        try:
-            database_test = list(json.load(read_file))
-        except json.JSONDecodeError:
-            database_test = None
-        print(database_test)
-    with open("db_test.json", "w") as file:
-        user_exists = False
-
-        if database_test is not None:
-            for user in database_test:
-                if base64.b64encode(user_login.encode('UTF-8')).decode('UTF-8') == user['login']:
-                    user_exists = True
-                    showwarning('Ошибка', "Такое имя пользователя уже существует!")
-
-        else:
-            database_test = []
-        if not user_exists:
-            user_login = base64.b64encode(user_login.encode('UTF-8')).decode('UTF-8')
-            user_password = base64.b64encode(user_password.encode('UTF-8')).decode('UTF-8')
-            database_test.append({'login': user_login, 'password': user_password})
-            json.dump(database_test, file)
-            showinfo("Успех!", "Регистрация успешна, вы вернётесь к основному экрану.")
-            register_window.destroy()
+    try:
+        user_store.register(user_login, user_password)
+    except users.UserExists:
+        showwarning('Ошибка', "Такое имя пользователя уже существует!")
+    else:
+        showinfo("Успех!", "Регистрация успешна, вы вернётесь к основному экрану.")
+        register_window.destroy()
 
 
 def login():
     user_login = entry_login_name.get()
     user_password = entry_login_password.get()
 
-    user_login = base64.b64encode(user_login.encode('UTF-8')).decode('UTF-8')
-    user_password = base64.b64encode(user_password.encode('UTF-8')).decode('UTF-8')
-
-    with open("db_test.json", "r") as read_file:
-        try:
-            database_test = list(json.load(read_file))
-        except json.JSONDecodeError:
-            database_test = None
-
-    with open("db_test.json", "w") as file:  # Проверка на наличие пользователя в базе
-        user_exists = False
-        if database_test is not None:
-            for user in database_test:
-                if user["login"] == user_login and user['password'] == user_password:
-                    user_exists = True
-                    showinfo('Вход прошел успешно', 'Вход совершен')
-                    user_login = base64.b64decode(user_login).decode('UTF-8')
-                    login_success(user_login)
-
-        if not user_exists:
-            if database_test is None:
-                database_test = []
-            showwarning('Ошибка', 'Неверное имя пользователя или пароль')
-        json.dump(database_test, file)
+    if user_store.authenticate(user_login, user_password):
+        showinfo('Вход прошел успешно', 'Вход совершен')
+        login_success(user_login)
+    else:
+        showwarning('Ошибка', 'Неверное имя пользователя или пароль')
 
 
 def login_success(login):
@@ -86,6 +51,14 @@ def login_success(login):
     welcome_label = Label(welcome_window, text=f"Добро пожаловать, {login} !", font=font)
     welcome_label.pack()
 
+    # Which side the computer plays, '' for two players
+    global engine_side
+    engine_side = StringVar(welcome_window, value='black')
+    for text, value in (("Играть белыми против компьютера", 'black'),
+                        ("Играть чёрными против компьютера", 'white'),
+                        ("Два игрока", '')):
+        Radiobutton(welcome_window, text=text, variable=engine_side, value=value).pack(anchor='w', padx=150)
+
     button_start = Button(welcome_window, text="Начать", command=game_start, bg='brown', fg='white')
     button_start.pack()
     login_window.destroy()
@@ -95,8 +68,9 @@ game = board.Board()
 
 
 def game_start():
+    engine_color = engine_side.get() or None
     welcome_window.destroy()
-    display(game)
+    display(game, engine_color=engine_color, record_path=GAMES_RECORD)
 
 
 def open_register_window():
@@ -0,0 +1,178 @@
+'''
+    Streaming FEN/EPD batch analyzer
+
+    Reads one position per line (FEN, or EPD with its operations) from
+    files or stdin and writes one JSON object per line:
+
+        python -m chesslib.analyse positions.epd --depth 3 --workers 4
+
+    Every stage is a generator, so memory use does not depend on the
+    size of the input.
+'''
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+import json
+import sys
+
+from . import board
+from . import engine
+from . import parallel
+
+
+def read_records(stream):
+    '''
+        Yield (line number, text) for every non-blank, non-comment line
+    '''
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield number, line
+
+
+def split_epd(line):
+    '''
+        Return (fen, operations) for a FEN or EPD line. EPD lines have
+        four position fields followed by "opcode operand;" operations;
+        their hmvc/fmvn operations fill in the clocks.
+    '''
+    fields = line.split(None, 4)
+    rest = fields[4] if len(fields) > 4 else ''
+    clocks = rest.split()
+    if len(clocks) == 2 and clocks[0].isdigit() and clocks[1].isdigit():
+        return line, {}
+
+    operations = {}
+    for operation in rest.split(';'):
+        operation = operation.strip()
+        if not operation: continue
+        opcode, _, operand = operation.partition(' ')
+        operations[opcode] = operand.strip().strip('"')
+    fen = ' '.join(fields[:4] + [operations.get('hmvc', '0'), operations.get('fmvn', '1')])
+    return fen, operations
+
+
+def parse(records):
+    for number, line in records:
+        fen, operations = split_epd(line)
+        result = {'line': number, 'fen': fen}
+        if operations: result['operations'] = operations
+        yield result
+
+
+def position_errors(chessboard):
+    '''
+        Return a list of reasons `chessboard` can not occur in a game
+    '''
+    errors = []
+    for color in ('white', 'black'):
+        kings = [index for index in chessboard.occupancy[color]
+                 if chessboard.is_king(chessboard.squares[index])]
+        if len(kings) != 1:
+            errors.append('%s has %d kings' % (color, len(kings)))
+    for index in chessboard.occupancy['white'] | chessboard.occupancy['black']:
+        if chessboard.is_pawn(chessboard.squares[index]) and index // 8 in (0, 7):
+            errors.append('pawn on ' + board.SQUARES[index])
+    if not errors:
+        waiting = chessboard.get_enemy(chessboard.player_turn)
+        if chessboard.is_in_check(waiting):
+            errors.append(waiting + ' is in check but not to move')
+    return errors
+
+
+def validate(items):
+    '''
+        Attach a Board to every item, or an 'error' if it is unusable
+    '''
+    for item in items:
+        try:
+            chessboard = board.Board(item['fen'])
+        except board.ChessError as error:
+            item['error'] = error.__class__.__name__
+        else:
+            errors = position_errors(chessboard)
+            if errors: item['error'] = '; '.join(errors)
+            else: item['board'] = chessboard
+        yield item
+
+
+def classify(items):
+    for item in items:
+        chessboard = item.get('board')
+        if chessboard is not None:
+            moves = chessboard.legal_moves()
+            check = chessboard.is_in_check(chessboard.player_turn)
+            item['legal_moves'] = len(moves)
+            item['check'] = check
+            item['mate'] = check and not moves
+            item['stalemate'] = not check and not moves
+        yield item
+
+
+def score(items, depth):
+    '''
+        Add the engine's best move and score (centipawns for the side to
+        move) when `depth` is set
+    '''
+    searcher = engine.Engine() if depth else None
+    for item in items:
+        chessboard = item.get('board')
+        if searcher is not None and chessboard is not None and item['legal_moves']:
+            move = searcher.best_move(chessboard, engine.Limit(depth=depth))
+            item['best_move'] = str(move)
+            item['score'] = searcher.score
+        yield item
+
+
+def analyse(records, depth=None):
+    '''
+        The whole pipeline, yields one JSON-ready dict per record
+    '''
+    for item in score(classify(validate(parse(records))), depth):
+        item.pop('board', None)
+        yield item
+
+
+def _analyse_chunk(depth, records):
+    return list(analyse(records, depth))
+
+
+def analyse_parallel(records, depth=None, workers=None, chunk_size=256):
+    '''
+        analyse() with the records spread over worker processes, results
+        come back in input order
+    '''
+    workers = workers or 1
+    with ProcessPoolExecutor(workers) as executor:
+        chunks = parallel.chunked(records, chunk_size)
+        for results in parallel.imap_bounded(executor, partial(_analyse_chunk, depth),
+                                             chunks, 2 * workers):
+            for result in results:
+                yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze FEN/EPD positions, one per line')
+    parser.add_argument('files', nargs='*', help='input files (default: stdin)')
+    parser.add_argument('--depth', type=int, default=None, help='engine search depth')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes')
+    args = parser.parse_args(argv)
+
+    def records():
+        if not args.files:
+            for record in read_records(sys.stdin): yield record
+        for name in args.files:
+            with open(name) as stream:
+                for record in read_records(stream): yield record
+
+    if args.workers > 1:
+        results = analyse_parallel(records(), args.depth, args.workers)
+    else:
+        results = analyse(records(), args.depth)
+    for result in results:
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+'''
+    Batch
+
+    Many positions at once as NumPy arrays. A batch of N positions is an
+    (N, 65) int8 array of piece codes (column 64 is an always-empty pad
+    square that the move tables point at past the board edge) plus an
+    (N,) bool array of sides to move. Move masks, attack maps, check
+    flags and mobility are computed for the whole batch with array
+    operations, following the rules of Pawn, Rook and King in pieces.py.
+
+        batch = BoardBatch.from_fens(fens)
+        batch.in_check()     # (N, 2) bool, [white, black]
+        batch.mobility()     # (N, 2) pseudo-legal move counts
+'''
+import numpy as np
+
+from . import board
+from . import pieces
+
+
+PAWN, ROOK, KING = 1, 2, 3
+CODES = {'P': PAWN, 'R': ROOK, 'K': KING, 'p': -PAWN, 'r': -ROOK, 'k': -KING}
+PAD = 64
+
+
+def _padded(rows, width):
+    table = np.full((64, width), PAD, dtype=np.intp)
+    for index, row in enumerate(rows):
+        table[index, :len(row)] = row
+    return table
+
+
+# ROOK_RAYS[square, direction, step], padded with PAD
+ROOK_RAYS = np.full((64, 4, 7), PAD, dtype=np.intp)
+for _index, _rays in enumerate(pieces.ROOK_RAYS):
+    for _direction, _ray in enumerate(_rays):
+        ROOK_RAYS[_index, _direction, :len(_ray)] = _ray
+
+KING_MOVES = _padded(pieces.KING_MOVES, 8)
+PAWN_PUSHES = dict((color, _padded(pieces.PAWN_PUSHES[color], 2)) for color in ('white', 'black'))
+PAWN_ATTACKS = dict((color, _padded(pieces.PAWN_ATTACKS[color], 2)) for color in ('white', 'black'))
+
+
+class BoardBatch(object):
+    '''
+        N positions held as arrays, see the module docstring
+    '''
+
+    def __init__(self, squares, white_to_move):
+        self.squares = np.asarray(squares, dtype=np.int8)
+        self.white_to_move = np.asarray(white_to_move, dtype=bool)
+        if self.squares.ndim != 2 or self.squares.shape[1] != 65:
+            raise ValueError("squares must have shape (N, 65)")
+
+    @classmethod
+    def from_boards(cls, boards):
+        boards = list(boards)
+        squares = np.zeros((len(boards), 65), dtype=np.int8)
+        for row, chessboard in enumerate(boards):
+            for index in chessboard.occupancy['white'] | chessboard.occupancy['black']:
+                squares[row, index] = CODES[chessboard.squares[index].abbreviation]
+        return cls(squares, [chessboard.player_turn == 'white' for chessboard in boards])
+
+    @classmethod
+    def from_fens(cls, fens):
+        return cls.from_boards(board.Board(fen) for fen in fens)
+
+    def __len__(self):
+        return len(self.squares)
+
+    def _rook_reach(self):
+        '''
+            (N, 64, 4, 7) squares a rook on each square reaches: every
+            step up to and including the first occupied square
+        '''
+        occupied = self.squares[:, ROOK_RAYS] != 0
+        blocked = np.logical_or.accumulate(occupied, axis=-1)
+        before = np.zeros_like(blocked)
+        before[..., 1:] = blocked[..., :-1]
+        return ~before & (ROOK_RAYS != PAD)
+
+    def _masks(self, attacks_only):
+        squares = self.squares
+        board_squares = squares[:, :64]
+        kinds = np.abs(board_squares)
+        sign = np.sign(board_squares)
+        result = np.zeros((len(self), 64, 65), dtype=bool)
+        rows = np.arange(len(self))[:, None, None]
+        origins = np.arange(64)[None, :, None]
+
+        def own_or_not(targets):
+            # targets may hold empty or enemy pieces, unless only attacks are wanted
+            if attacks_only: return True
+            return squares[:, targets] * sign[..., None] <= 0
+
+        # Rooks
+        reach = self._rook_reach() & (kinds == ROOK)[..., None, None]
+        if not attacks_only:
+            reach &= squares[:, ROOK_RAYS] * sign[..., None, None] <= 0
+        result[rows[..., None], origins[..., None], ROOK_RAYS[None]] |= reach
+
+        # Kings
+        allowed = (kinds == KING)[..., None] & (KING_MOVES != PAD) & own_or_not(KING_MOVES)
+        result[rows, origins, KING_MOVES[None]] |= allowed
+
+        # Pawns
+        for color, code in (('white', PAWN), ('black', -PAWN)):
+            is_pawn = (board_squares == code)[..., None]
+            attacks = PAWN_ATTACKS[color]
+            allowed = is_pawn & (attacks != PAD)
+            if not attacks_only:
+                allowed &= squares[:, attacks] * code < 0
+            result[rows, origins, attacks[None]] |= allowed
+            if attacks_only: continue
+            pushes = PAWN_PUSHES[color]
+            empty = (squares[:, pushes] == 0) & (pushes != PAD)
+            empty[..., 1] &= empty[..., 0]
+            result[rows, origins, pushes[None]] |= is_pawn & empty
+
+        return result[..., :64]
+
+    def move_masks(self):
+        '''
+            (N, 64, 64) bool, [n, from, to] set for every pseudo-legal move
+            of either color
+        '''
+        return self._masks(False)
+
+    def attack_maps(self):
+        '''
+            (N, 2, 64) bool, squares attacked by white ([:, 0]) and black
+        '''
+        attacks = self._masks(True)
+        white = (self.squares[:, :64] > 0)[..., None]
+        return np.stack([(attacks & white).any(axis=1), (attacks & ~white).any(axis=1)], axis=1)
+
+    def in_check(self):
+        '''
+            (N, 2) bool, is the white ([:, 0]) / black king attacked
+        '''
+        attacked = self.attack_maps()
+        result = np.zeros((len(self), 2), dtype=bool)
+        for side, code in enumerate((KING, -KING)):
+            rows, kings = np.nonzero(self.squares[:, :64] == code)
+            result[rows, side] = attacked[rows, 1 - side, kings]
+        return result
+
+    def mobility(self):
+        '''
+            (N, 2) pseudo-legal move counts for white and black
+        '''
+        per_square = self.move_masks().sum(axis=2)
+        white = self.squares[:, :64] > 0
+        return np.stack([(per_square * white).sum(axis=1),
+                         (per_square * ~white).sum(axis=1)], axis=1)
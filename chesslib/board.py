@@ -1,7 +1,9 @@
-from itertools import groupby
-from copy import deepcopy
+from collections import namedtuple
+from collections.abc import MutableMapping
 
+from . import coords
 from . import pieces
+import random
 import re
 
 
@@ -13,33 +15,136 @@ class Check(ChessError): pass
 class CheckMate(ChessError): pass
 class Draw(ChessError): pass
 class NotYourTurn(ChessError): pass
+class InvalidFen(ChessError): pass
 
 
 FEN_STARTING = '4k2r/8/8/8/8/8/3PP3/4K3 w KQkq - 0 1'
-RANK_REGEX = re.compile(r"^[A-Z][1-8]$")
 
+# Square index -> name, index = row * 8 + column (A1 = 0, H8 = 63)
+SQUARES = coords.NAMES
 
-class Board(dict):
+# Everything make_move needs to restore the previous position
+Undo = namedtuple('Undo', ('from_', 'to', 'piece', 'captured', 'promotion', 'last_move',
+                           'halfmove_clock', 'fullmove_number', 'player_turn',
+                           'castling', 'en_passant', 'key', 'repetitions'))
+
+
+class Move(namedtuple('Move', ('from_', 'to', 'promotion'))):
+    '''
+        A move between two square indices, `promotion` is the abbreviation
+        of the piece a pawn promotes to (or None)
+    '''
+    __slots__ = ()
+
+    def __str__(self):
+        return SQUARES[self.from_] + SQUARES[self.to] + (self.promotion or '')
+
+
+# FEN codec tables
+FEN_PIECES = dict((letter, pieces.piece(letter)) for letter in 'KRPkrp')
+FEN_SKIPS = dict((str(count), count) for count in range(1, 9))
+FEN_DIGITS = ' 12345678'
+FEN_TURNS = {'w': 'white', 'b': 'black'}
+FEN_CASTLING = re.compile(r'^(-|K?Q?k?q?)$')
+FEN_EN_PASSANT = re.compile(r'^(-|[a-h][36])$')
+FEN_CLOCK = re.compile(r'^(0|[1-9][0-9]*)$')
+# castling rights lost when a piece leaves or is captured on these squares
+CASTLING_SQUARES = {4: 'KQ', 7: 'K', 0: 'Q', 60: 'kq', 63: 'k', 56: 'q'}
+
+
+def parse_fen(text):
+    '''
+        Split a FEN string into (squares, player_turn, castling,
+        en_passant, halfmove_clock, fullmove_number) in one pass over the
+        placement field, raising InvalidFen for anything that would not
+        be written back identically
+    '''
+    fields = text.split()
+    if len(fields) != 6: raise InvalidFen(text)
+    placement, turn, castling, en_passant, halfmove, fullmove = fields
+
+    squares = [None] * 64
+    index, column, skipped = 56, 0, False
+    for char in placement:
+        piece = FEN_PIECES.get(char)
+        if piece is not None:
+            if column == 8: raise InvalidFen(text)
+            squares[index + column] = piece
+            column += 1
+            skipped = False
+        elif char in FEN_SKIPS:
+            column += FEN_SKIPS[char]
+            if column > 8 or skipped: raise InvalidFen(text)
+            skipped = True
+        elif char == '/' and column == 8 and index:
+            index, column, skipped = index - 8, 0, False
+        else:
+            raise InvalidFen(text)
+    if index or column != 8 or turn not in FEN_TURNS or \
+       not castling or not FEN_CASTLING.match(castling) or \
+       not FEN_EN_PASSANT.match(en_passant) or \
+       not FEN_CLOCK.match(halfmove) or not FEN_CLOCK.match(fullmove):
+        raise InvalidFen(text)
+    return squares, FEN_TURNS[turn], castling, en_passant, int(halfmove), int(fullmove)
+
+
+def format_fen(squares, player_turn, castling, en_passant, halfmove_clock, fullmove_number):
+    '''
+        The inverse of parse_fen
+    '''
+    rows = []
+    for index in range(56, -8, -8):
+        row, empty = '', 0
+        for piece in squares[index:index + 8]:
+            if piece is None:
+                empty += 1
+                continue
+            if empty: row, empty = row + FEN_DIGITS[empty], 0
+            row += piece.abbreviation
+        if empty: row += FEN_DIGITS[empty]
+        rows.append(row)
+    return '%s %s %s %s %d %d' % ('/'.join(rows), player_turn[0], castling, en_passant,
+                                  halfmove_clock, fullmove_number)
+
+
+# Zobrist keys: one random 64-bit number per (piece, square) plus one for
+# black to move. Seeded so position keys are the same in every process.
+_zobrist_random = random.Random(20240501)
+ZOBRIST_PIECES = dict((letter, tuple(_zobrist_random.getrandbits(64) for index in range(64)))
+                      for letter in 'KRPkrp')
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+class Board(MutableMapping):
     '''
        Board
 
        A simple chessboard class
 
+       The position is kept in `squares`, a list of 64 pieces (or None)
+       indexed by square number. The mapping interface (board["E2"],
+       board[(1, 4)], items(), ...) is a facade over that list.
+       `occupancy` (color -> set of square indices), `kings`
+       (color -> square index) and the Zobrist position `key` are kept
+       in step with it by `_place`. `repetitions` counts how often each
+       key occurred since the last irreversible move.
+
        TODO:
 
-        * PGN export
+        * PGN export (Done, see pgn.py)
         * En passant (Done TJS)
         * Castling (Done TJS)
         * Promoting pawns (Done TJS)
         * 3-time repition (Done TJS)
-        * Fifty-move rule
-        * Take-backs
+        * Fifty-move rule (Done)
+        * Take-backs (make_move/unmake_move)
         * row/column lables
         * captured piece imbalance (show how many pawns pieces player is up)
     '''
 
-    axis_y = ('A', 'B', 'C', 'D', 'E', 'F', 'G', 'H')
+    axis_y = tuple(coords.FILES)
     axis_x = tuple(range(1, 9))  # (1,2,3,...8)
+    square_names = SQUARES
 
     captured_pieces = { 'white': [], 'black': [] }
     player_turn = None
@@ -47,63 +152,236 @@ class Board(dict):
     halfmove_clock = 0
     fullmove_number = 1
 
+    # a record.GameRecord that every move played is appended to
+    recorder = None
+
     def __init__(self, fen = None):
         if fen is None: self.load(FEN_STARTING)
         else: self.load(fen)
-        self.last_move = None ## to support en passent
-        self.positions = [None]
-        
+
+    # Return the square index of `coord` ("E2", (row, col) or an
+    # index), or None if it lies off the board
+    square_index = staticmethod(coords.index)
+
     def __getitem__(self, coord):
-        if isinstance(coord, str):
-            coord = coord.upper()
-            if not re.match(RANK_REGEX, coord.upper()): raise KeyError
-        elif isinstance(coord, tuple):
-            coord = self.letter_notation(coord)
+        index = self.square_index(coord)
+        if index is None: return None
+        return self.squares[index]
+
+    def __setitem__(self, coord, piece):
+        index = self.square_index(coord)
+        if index is None: raise InvalidCoord(coord)
+        self._place(index, piece)
+
+    def __delitem__(self, coord):
+        index = self.square_index(coord)
+        if index is None or self.squares[index] is None: raise KeyError(coord)
+        self._place(index, None)
+
+    def __contains__(self, coord):
         try:
-            return super(Board, self).__getitem__(coord)
+            return self[coord] is not None
         except KeyError:
-            return None
+            return False
 
-    def save_to_file(self): pass
+    def __iter__(self):
+        for index, piece in enumerate(self.squares):
+            if piece is not None: yield SQUARES[index]
+
+    def __len__(self):
+        return len(self.occupancy['white']) + len(self.occupancy['black'])
+
+    def _place(self, index, piece):
+        '''
+            Put `piece` (or None) on square `index` and update the
+            occupancy and king indexes
+        '''
+        self.fen = None
+        old = self.squares[index]
+        if old is not None:
+            self.key ^= ZOBRIST_PIECES[old.abbreviation][index]
+            self.occupancy[old.color].discard(index)
+            if self.kings[old.color] == index: self.kings[old.color] = None
+        self.squares[index] = piece
+        if piece is not None:
+            self.key ^= ZOBRIST_PIECES[piece.abbreviation][index]
+            self.occupancy[piece.color].add(index)
+            if self.is_king(piece): self.kings[piece.color] = index
+
+    def save_to_file(self, path):
+        '''
+            Append this game, its starting position and every move made,
+            to the binary game record at `path`
+        '''
+        from . import record
+        with record.GameRecord(path) as games:
+            games.write_game(self.start_fen, self.history())
+
+    def history(self):
+        '''
+            The Moves made since the starting position
+        '''
+        return [Move(undo.from_, undo.to, undo.promotion) for undo in self.undo_stack]
 
     def is_in_check_after_move(self, p1, p2):
-        # Create a temporary board
-        tmp = deepcopy(self)
-        tmp._do_move(p1, p2)
-        return tmp.is_in_check(self[p1].color)
+        color = self[p1].color
+        self.make_move(p1, p2)
+        try:
+            return self.is_in_check(color)
+        finally:
+            self.unmake_move()
+
+    def make_move(self, p1, p2, promote='r'):
+        '''
+            Move a piece without validation, pushing what is needed to
+            take it back onto the undo stack
+        '''
+        from_, to = self.square_index(p1), self.square_index(p2)
+        piece = self.squares[from_]
+        dest  = self.squares[to]
+        promotion = None
+        if self.is_pawn(piece) and to // 8 in (0, 7): promotion = promote.upper()
+        self.undo_stack.append(Undo(from_, to, piece, dest, promotion, self.last_move,
+                                    self.halfmove_clock, self.fullmove_number,
+                                    self.player_turn, self.castling, self.en_passant,
+                                    self.key, None))
+        self._do_move(from_, to, promote)
+        self._finish_move(piece, dest, SQUARES[from_], SQUARES[to])
+
+        if from_ in CASTLING_SQUARES or to in CASTLING_SQUARES:
+            lost = CASTLING_SQUARES.get(from_, '') + CASTLING_SQUARES.get(to, '')
+            self.castling = ''.join(right for right in self.castling if right not in lost) or '-'
+        if self.is_pawn(piece) and abs(to - from_) == 16:
+            self.en_passant = SQUARES[(from_ + to) // 2].lower()
+        else:
+            self.en_passant = '-'
+
+        # for three-fold repetition
+        if self.halfmove_clock == 0:
+            # Irreversible move, earlier positions can not come back
+            self.undo_stack[-1] = self.undo_stack[-1]._replace(repetitions=self.repetitions)
+            self.repetitions = {}
+        self.repetitions[self.key] = self.repetitions.get(self.key, 0) + 1
+
+    def unmake_move(self):
+        '''
+            Take back the last move played with make_move
+        '''
+        undo = self.undo_stack.pop()
+        count = self.repetitions.pop(self.key) - 1
+        if count: self.repetitions[self.key] = count
+        if undo.repetitions is not None: self.repetitions = undo.repetitions
+        self._place(undo.to, undo.captured)
+        self._place(undo.from_, undo.piece)
+        self.last_move = undo.last_move
+        self.halfmove_clock = undo.halfmove_clock
+        self.fullmove_number = undo.fullmove_number
+        self.player_turn = undo.player_turn
+        self.castling = undo.castling
+        self.en_passant = undo.en_passant
+        self.key = undo.key
+        self.fen = None
+        return SQUARES[undo.from_], SQUARES[undo.to]
 
     def move(self, p1, p2, promote='r'):
         p1, p2 = p1.upper(), p2.upper()
-        piece = self[p1]
-        dest  = self[p2]
+        try:
+            from_, to = self.square_index(p1), self.square_index(p2)
+        except KeyError as error:
+            raise InvalidCoord(error.args[0])
+        piece = self.squares[from_] if from_ is not None else None
+        if piece is None:
+            raise InvalidMove("No piece on " + p1)
 
         if self.player_turn != piece.color:
             raise NotYourTurn("Not " + piece.color + "'s turn!")
 
-        enemy = self.get_enemy(piece.color)
-        possible_moves = piece.possible_moves(p1)
-        # 0. Check if p2 is in the possible moves
-        if p2 not in possible_moves:
-            raise InvalidMove
-        
-        # If enemy has any moves look for check
-        if self.all_possible_moves(enemy):
-            if self.is_in_check_after_move(p1, p2):
-                raise Check
-        if not possible_moves and self.is_in_check(piece.color):
-            raise CheckMate
-        elif not possible_moves:
-            raise Draw
-        else:
-            self._do_move(p1, p2, promote)
-            self._finish_move(piece, dest, p1,p2)
-            if self.positions[-1] in self.positions[:-1]:
-                count = 1
-                for position in self.positions[:-1]:
-                    count += (position == self.positions[-1])
-                print('repetition count:', count)
-                if count >= 3:
-                    raise Draw
+        if not any(move.from_ == from_ and move.to == to
+                   for move in self.legal_moves(piece.color)):
+            # 0. Check if p2 is in the possible moves
+            if to not in piece.targets(self, from_):
+                raise InvalidMove
+            raise Check
+
+        self.make_move(p1, p2, promote)
+        if self.recorder is not None:
+            undo = self.undo_stack[-1]
+            self.recorder.append(Move(from_, to, undo.promotion))
+        if not self.legal_moves(self.player_turn):
+            if self.is_in_check(self.player_turn):
+                raise CheckMate
+            raise Draw("stalemate")
+        if self.repetitions[self.key] >= 3:
+            raise Draw("threefold repetition")
+        if self.halfmove_clock >= 100:
+            raise Draw("fifty-move rule")
+
+    def legal_moves(self, color=None):
+        '''
+            Return a tuple of `color`'s (default: the side to move) legal
+            moves as Move tuples. Pins and checkers are worked out once per
+            position; the result is cached until the position changes.
+        '''
+        if color is None: color = self.player_turn
+        if color not in ("black", "white"): raise InvalidColor
+        cache = self.legal_moves_cache
+        if cache is not None and cache[0] == self.key and cache[1] == color:
+            return cache[2]
+        moves = tuple(self._generate_legal_moves(color))
+        self.legal_moves_cache = (self.key, color, moves)
+        return moves
+
+    def _generate_legal_moves(self, color):
+        squares = self.squares
+        enemy = self.get_enemy(color)
+        king = self.kings[color]
+
+        checkers, evasions, pins = [], None, {}
+        if king is not None:
+            for ray in pieces.ROOK_RAYS[king]:
+                own = None
+                for step, dest in enumerate(ray):
+                    piece = squares[dest]
+                    if piece is None: continue
+                    if piece.color == color:
+                        if own is not None: break
+                        own = dest
+                        continue
+                    if self.is_rook(piece):
+                        if own is None:
+                            checkers.append(dest)
+                            evasions = set(ray[:step + 1])
+                        else:
+                            pins[own] = set(ray[:step + 1])
+                    break
+            for dest in pieces.PAWN_ATTACKS[color][king]:
+                piece = squares[dest]
+                if piece is not None and piece.color == enemy and self.is_pawn(piece):
+                    checkers.append(dest)
+                    evasions = set([dest])
+
+        if len(checkers) < 2:
+            for index in sorted(self.occupancy[color]):
+                if index == king: continue
+                piece = squares[index]
+                allowed = pins.get(index)
+                if evasions is not None:
+                    allowed = evasions if allowed is None else allowed & evasions
+                promotes = self.is_pawn(piece) and index // 8 == (6 if color == 'white' else 1)
+                for dest in piece.targets(self, index):
+                    if allowed is not None and dest not in allowed: continue
+                    yield Move(index, dest, 'R' if promotes else None)
+
+        if king is not None:
+            # Lift the king so it does not shield squares behind it
+            piece = squares[king]
+            squares[king] = None
+            try:
+                for dest in piece.targets(self, king):
+                    if not self.is_square_attacked(dest, enemy):
+                        yield Move(king, dest, None)
+            finally:
+                squares[king] = piece
 
     def get_enemy(self, color):
         if color == "white":
@@ -115,47 +393,32 @@ class Board(dict):
         '''
             Move a piece without validation
         '''
-        piece = self[p1]
-        dest  = self[p2]
+        from_, to = self.square_index(p1), self.square_index(p2)
+        piece = self.squares[from_]
 
         # if piece is a king and move is a castle, move the rook too
 
-        del self[p1]
-        self.last_move = (p1, p2)
+        self._place(from_, None)
+        self.last_move = (SQUARES[from_], SQUARES[to])
         # check pawn promotion
 
-        if self.is_pawn(piece) and p2[1] in '18':
+        if self.is_pawn(piece) and to // 8 in (0, 7):
             piece = pieces.Pieces[promote.upper()](piece.color)
-            piece.board = self
-        self[p2] = piece
-
-        # for three-fold repetition
-
-        fen = self.export().split()
-        self.positions.append(fen[0] + fen[1])
+        self._place(to, piece)
 
     def _finish_move(self, piece, dest, p1, p2):
         '''
-            Set next player turn, count moves, log moves, etc.
+            Set next player turn, count moves, etc. The move log is
+            the undo stack, see history() and pgn.py for its SAN.
         '''
         enemy = self.get_enemy(piece.color)
         if piece.color == 'black':
             self.fullmove_number += 1
         self.halfmove_clock +=1
+        if self.player_turn != enemy: self.key ^= ZOBRIST_BLACK_TO_MOVE
         self.player_turn = enemy
-        abbr = piece.abbreviation
-        if abbr == 'P':
-            # Pawn has no letter
-            abbr = ''
-            # Pawn resets halfmove_clock
-            self.halfmove_clock = 0
-        if dest is None:
-            # No capturing
-            movetext = abbr +  p2.lower()
-        else:
-            # Capturing
-            movetext = abbr + 'x' + p2.lower()
-            # Capturing resets halfmove_clock
+        if self.is_pawn(piece) or dest is not None:
+            # Pawn moves and captures reset halfmove_clock
             self.halfmove_clock = 0
 
     def all_possible_moves(self, color):
@@ -165,23 +428,33 @@ class Board(dict):
         '''
         if(color not in ("black", "white")): raise InvalidColor
         result = []
-        for coord in list(self.keys()):
-            if (self[coord] is not None) and self[coord].color == color:
-                moves = self[coord].possible_moves(coord)
-                if moves: result += moves
+        squares = self.squares
+        for index in sorted(self.occupancy[color]):
+            moves = squares[index].possible_moves(self, SQUARES[index])
+            if moves: result += moves
         return result
 
     def occupied(self, color):
         '''
             Return a list of coordinates occupied by `color`
         '''
-        result = []
         if(color not in ("black", "white")): raise InvalidColor
+        return [SQUARES[index] for index in sorted(self.occupancy[color])]
 
-        for coord in self:
-            if self[coord].color == color:
-                result.append(coord)
-        return result
+    def occupied_squares(self, color):
+        '''
+            Return the set of square indices occupied by `color`.
+            This is the live index, do not modify it.
+        '''
+        if(color not in ("black", "white")): raise InvalidColor
+        return self.occupancy[color]
+
+    def king_square(self, color):
+        '''
+            Return the square index of `color`'s king (None if there is none)
+        '''
+        if(color not in ("black", "white")): raise InvalidColor
+        return self.kings[color]
 
     def is_king(self, piece):
         return isinstance(piece, pieces.King)
@@ -194,9 +467,9 @@ class Board(dict):
 
 
     def get_king_position(self, color):
-        for pos in list(self.keys()):
-            if self.is_king(self[pos]) and self[pos].color == color:
-                return pos
+        index = self.king_square(color)
+        if index is not None:
+            return SQUARES[index]
 
     def get_king(self, color):
 
@@ -207,83 +480,114 @@ class Board(dict):
     def is_in_check(self, color):
         if color not in ("black", "white"):
             raise InvalidColor
-        king = self.get_king(color)
-        enemy = self.get_enemy(color)
-        return king in list(map(self.__getitem__, self.all_possible_moves(enemy)))
+        king = self.kings[color]
+        if king is None: return False
+        return self.is_square_attacked(king, self.get_enemy(color))
 
-    def letter_notation(self,coord):
-        if not self.is_in_bounds(coord): return
-        try:
-            return self.axis_y[int(coord[1])] + str(self.axis_x[int(coord[0])])
-        except IndexError:
-            raise InvalidCoord
+    def is_square_attacked(self, square, by_color):
+        '''
+            Return True if a `by_color` piece attacks `square`.
+            Looks outward from the square along rook rays, king
+            neighbours and pawn diagonals instead of generating moves.
+        '''
+        if by_color not in ("black", "white"):
+            raise InvalidColor
+        index = self.square_index(square)
+        squares = self.squares
+
+        for ray in pieces.ROOK_RAYS[index]:
+            for dest in ray:
+                piece = squares[dest]
+                if piece is None: continue
+                if piece.color == by_color and self.is_rook(piece): return True
+                break
+
+        king = self.kings[by_color]
+        if king is not None and king in pieces.KING_MOVES[index]:
+            return True
+
+        # a pawn attacks `square` from where an enemy pawn on `square` would capture
+        for dest in pieces.PAWN_ATTACKS[self.get_enemy(by_color)][index]:
+            piece = squares[dest]
+            if piece is not None and piece.color == by_color and self.is_pawn(piece):
+                return True
+        return False
+
+    def letter_notation(self, coord):
+        index = coords.ROW_COL_INDEX.get(tuple(coord))
+        if index is not None: return SQUARES[index]
 
     def number_notation(self, coord):
-        return int(coord[1])-1, self.axis_y.index(coord[0])
+        index = coords.NAME_INDEX.get(coord)
+        if index is None: raise InvalidCoord(coord)
+        return coords.ROW_COLS[index]
 
     def is_in_bounds(self, coord):
-        if coord[1] < 0 or coord[1] > 7 or\
-           coord[0] < 0 or coord[0] > 7:
-            return False
-        else:
-            return True
+        return tuple(coord) in coords.ROW_COL_INDEX
+
+    def copy(self):
+        '''
+            A new Board with the same position, sharing the (immutable)
+            pieces. The repetition counts come along; the undo stack,
+            recorder and move cache do not, so the copy's game starts
+            at the current position.
+        '''
+        other = self.__class__.__new__(self.__class__)
+        other.squares = list(self.squares)
+        other.occupancy = {'white': set(self.occupancy['white']),
+                           'black': set(self.occupancy['black'])}
+        other.kings = dict(self.kings)
+        other.key = self.key
+        other.repetitions = dict(self.repetitions)
+        other.legal_moves_cache = None
+        other.last_move = self.last_move
+        other.castling = self.castling
+        other.en_passant = self.en_passant
+        other.player_turn = self.player_turn
+        other.halfmove_clock = self.halfmove_clock
+        other.fullmove_number = self.fullmove_number
+        other.fen = self.fen
+        other.start_fen = self.export()
+        other.undo_stack = []
+        return other
 
     def clear(self):
-        dict.clear(self)
-        self.positions = [None]
+        self.squares = [None] * 64
+        self.occupancy = {'white': set(), 'black': set()}
+        self.kings = {'white': None, 'black': None}
+        self.key = 0
+        self.repetitions = {}
+        self.legal_moves_cache = None
+        self.last_move = None ## to support en passent
+        self.castling = '-'
+        self.en_passant = '-'
+        self.fen = None
+        self.undo_stack = []
         
     def load(self, fen):
         '''
             Import state from FEN notation
         '''
+        squares, turn, castling, en_passant, halfmove, fullmove = parse_fen(fen)
         self.clear()
-        # Split data
-        fen = fen.split(' ')
-        # Expand blanks
-        def expand(match): return ' ' * int(match.group(0))
-
-        fen[0] = re.compile(r'\d').sub(expand, fen[0])
-        self.positions = [None]
-        for x, row in enumerate(fen[0].split('/')):
-            for y, letter in enumerate(row):
-                if letter == ' ': continue
-                coord = self.letter_notation((7-x,y))
-                self[coord] = pieces.piece(letter)
-                self[coord].place(self)
-
-        if fen[1] == 'w': self.player_turn = 'white'
-        else: self.player_turn = 'black'
-
-
-        self.halfmove_clock = int(fen[4])
-        self.fullmove_number = int(fen[5])
+        self.start_fen = fen
+        for index, piece in enumerate(squares):
+            if piece is not None: self._place(index, piece)
+
+        self.player_turn = turn
+        if turn == 'black': self.key ^= ZOBRIST_BLACK_TO_MOVE
+        self.repetitions = {self.key: 1}
+        self.castling = castling
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove
+        self.fullmove_number = fullmove
 
     def export(self):
         '''
-            Export state to FEN notation
+            Export state to FEN notation. The string is cached until the
+            position changes.
         '''
-        def join(k, g):
-            if k == ' ': return str(len(g))
-            else: return "".join(g)
-
-        def replace_spaces(row):
-            # replace spaces with their count
-            result = [join(k, list(g)) for k,g in groupby(row)]
-            return "".join(result)
-
-
-        result = ''
-        for number in self.axis_x[::-1]:
-            for letter in self.axis_y:
-                piece = self[letter+str(number)]
-                if piece is not None:
-                    result += piece.abbreviation
-                else: result += ' '
-            result += '/'
-
-        result = result[:-1] # remove trailing "/"
-        result = replace_spaces(result)
-        result += " " + (" ".join([self.player_turn[0],
-                         str(self.halfmove_clock),
-                         str(self.fullmove_number)]))
-        return result
+        if self.fen is None:
+            self.fen = format_fen(self.squares, self.player_turn, self.castling,
+                                  self.en_passant, self.halfmove_clock, self.fullmove_number)
+        return self.fen
@@ -0,0 +1,60 @@
+'''
+    Coordinates
+
+    A square can be named by its index (row * 8 + column, A1 = 0, H8 = 63),
+    its algebraic name ("E2", "e2") or its (row, column) pair. Every
+    conversion between them is a precomputed table lookup.
+
+        coords.index("E2")     # 12
+        coords.ROW_COLS[12]    # (1, 4)
+        coords.NAMES[12]       # "E2"
+'''
+import re
+
+
+FILES = 'ABCDEFGH'
+RANKS = '12345678'
+
+# index -> name, index -> (row, column)
+NAMES = tuple(letter + number for number in RANKS for letter in FILES)
+ROW_COLS = tuple(divmod(index, 8) for index in range(64))
+
+# name (either case) -> index, (row, column) -> index
+NAME_INDEX = dict((name, index) for index, name in enumerate(NAMES))
+NAME_INDEX.update((name.lower(), index) for index, name in enumerate(NAMES))
+ROW_COL_INDEX = dict((row_col, index) for index, row_col in enumerate(ROW_COLS))
+
+# every accepted spelling of a square -> index
+INDEX = dict((index, index) for index in range(64))
+INDEX.update(NAME_INDEX)
+INDEX.update(ROW_COL_INDEX)
+
+# well formed names that lie off the board, such as "Z1"
+OFF_BOARD_NAME = re.compile(r"^[A-Za-z][1-8]$")
+
+
+def index(coord):
+    '''
+        Return the square index of `coord` (an index, a name or a
+        (row, column) pair), or None if it lies off the board. Raises
+        KeyError for a malformed name.
+    '''
+    try:
+        return INDEX[coord]
+    except (KeyError, TypeError):
+        pass
+    if isinstance(coord, (int, tuple)): return None
+    if isinstance(coord, str) and OFF_BOARD_NAME.match(coord): return None
+    raise KeyError(coord)
+
+
+def name(coord):
+    '''
+        Return the name of `coord`, or None if it lies off the board
+    '''
+    square = index(coord)
+    if square is not None: return NAMES[square]
+
+
+def in_bounds(row_col):
+    return row_col in ROW_COL_INDEX
@@ -0,0 +1,253 @@
+'''
+    Engine
+
+    Iterative deepening alpha-beta search for the computer opponent.
+
+        engine = Engine()
+        move = engine.best_move(chessboard, Limit(time=1.0))
+        chessboard.move(str(move)[:2], str(move)[2:4])
+'''
+from collections import namedtuple
+import time
+
+
+# Search limits, any combination of plies, nodes and seconds (None = no limit)
+Limit = namedtuple('Limit', ('depth', 'nodes', 'time'), defaults=(None, None, None))
+
+DEFAULT_LIMIT = Limit(depth=4)
+MAX_DEPTH = 64
+
+MATE = 100000
+INFINITY = MATE + 1
+MATE_BOUND = MATE - 1000  # scores beyond this are mates, adjusted by ply
+
+PIECE_VALUES = {'P': 100, 'R': 500, 'K': 0}
+
+# Transposition table entry bounds
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchAborted(Exception): pass
+
+
+class TranspositionTable(object):
+    '''
+        Fixed size hash table of search results, indexed by the low bits
+        of the Zobrist key. An entry is replaced by any other position,
+        or by a search of the same position that is at least as deep.
+    '''
+
+    def __init__(self, size=1 << 16):
+        if size & (size - 1): raise ValueError("size must be a power of two")
+        self.mask = size - 1
+        self.entries = [None] * size
+
+    def probe(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+
+    def store(self, key, depth, score, bound, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] != key or depth >= entry[1]:
+            self.entries[index] = (key, depth, score, bound, move)
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+
+
+def evaluate(chessboard):
+    '''
+        Static evaluation in centipawns from the side to move's point of view
+    '''
+    squares = chessboard.squares
+    score = {'white': 0, 'black': 0}
+    for color in ('white', 'black'):
+        for index in chessboard.occupancy[color]:
+            piece = squares[index]
+            letter = piece.abbreviation.upper()
+            score[color] += PIECE_VALUES[letter]
+            if letter == 'P':
+                # Pawns gain value as they approach promotion
+                rank = index // 8 if color == 'white' else 7 - index // 8
+                score[color] += rank * rank * 2
+
+    # The side ahead in material herds the other king to the edge
+    # and brings its own king closer
+    white, black = chessboard.kings['white'], chessboard.kings['black']
+    if white is not None and black is not None:
+        distance = max(abs(white // 8 - black // 8), abs(white % 8 - black % 8))
+        for strong, weak in (('white', black), ('black', white)):
+            if score[strong] > score[chessboard.get_enemy(strong)] + 200:
+                row, col = divmod(weak, 8)
+                edge = max(3 - row, row - 4) + max(3 - col, col - 4)
+                score[strong] += edge * 10 + (7 - distance) * 4
+
+    side = chessboard.player_turn
+    return score[side] - score[chessboard.get_enemy(side)]
+
+
+class Engine(object):
+    '''
+        Alpha-beta searcher with a transposition table, captures and
+        promotions first, then killer moves
+    '''
+
+    def __init__(self, table_size=1 << 16):
+        self.table = TranspositionTable(table_size)
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self.stopped = False
+
+    def best_move(self, chessboard, limit=None):
+        '''
+            Search `chessboard` for the side to move within `limit` and
+            return the best Move found, or None if there is no legal move.
+            The board is left as it was.
+        '''
+        if limit is None: limit = DEFAULT_LIMIT
+        moves = chessboard.legal_moves()
+        if not moves: return None
+
+        max_depth = limit.depth
+        if max_depth is None:
+            max_depth = MAX_DEPTH if limit.nodes or limit.time else DEFAULT_LIMIT.depth
+
+        self.nodes = 0
+        self.stopped = False
+        self.killers = [[None, None] for ply in range(MAX_DEPTH + 1)]
+        self.node_limit = limit.nodes
+        self.deadline = None if limit.time is None else time.perf_counter() + limit.time
+        best = self.root_move = self._order(chessboard, moves, None, 0)[0]
+
+        undo_depth = len(chessboard.undo_stack)
+        for depth in range(1, min(max_depth, MAX_DEPTH) + 1):
+            try:
+                score = self._search(chessboard, depth, -INFINITY, INFINITY, 0)
+            except SearchAborted:
+                while len(chessboard.undo_stack) > undo_depth:
+                    chessboard.unmake_move()
+                break
+            best = self.root_move
+            self.depth, self.score = depth, score
+            if abs(score) > MATE_BOUND: break
+        return best
+
+    def stop(self):
+        '''
+            Make a search running on another thread return its best move
+            so far as soon as possible
+        '''
+        self.stopped = True
+
+    def _check_limits(self):
+        if self.stopped: raise SearchAborted
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchAborted
+        if self.deadline is not None and not self.nodes & 1023 \
+           and time.perf_counter() >= self.deadline:
+            raise SearchAborted
+
+    def _order(self, chessboard, moves, hash_move, ply):
+        squares = chessboard.squares
+        killers = self.killers[ply]
+
+        def priority(move):
+            if move == hash_move: return -1000000
+            captured = squares[move.to]
+            score = 0
+            if captured is not None:
+                # most valuable victim, least valuable attacker
+                score -= 10 * PIECE_VALUES[captured.abbreviation.upper()] + 1000
+                score += PIECE_VALUES[squares[move.from_].abbreviation.upper()] // 100
+            if move.promotion is not None:
+                score -= 5000
+            elif captured is None and move in killers:
+                score -= 500
+            return score
+
+        return sorted(moves, key=priority)
+
+    def _is_draw(self, chessboard):
+        return chessboard.halfmove_clock >= 100 or \
+            chessboard.repetitions.get(chessboard.key, 0) >= 2
+
+    def _search(self, chessboard, depth, alpha, beta, ply):
+        self.nodes += 1
+        self._check_limits()
+
+        if ply and self._is_draw(chessboard): return 0
+        if depth <= 0: return self._quiesce(chessboard, alpha, beta, ply)
+
+        key = chessboard.key
+        entry = self.table.probe(key)
+        hash_move = None
+        if entry is not None:
+            hash_move = entry[4]
+            if ply and entry[1] >= depth:
+                score = entry[2]
+                if score > MATE_BOUND: score -= ply
+                elif score < -MATE_BOUND: score += ply
+                if entry[3] == EXACT: return score
+                if entry[3] == LOWER and score >= beta: return score
+                if entry[3] == UPPER and score <= alpha: return score
+
+        moves = chessboard.legal_moves()
+        if not moves:
+            if chessboard.is_in_check(chessboard.player_turn): return -MATE + ply
+            return 0
+
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, None
+        for move in self._order(chessboard, moves, hash_move, ply):
+            capture = chessboard.squares[move.to] is not None
+            chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+            score = -self._search(chessboard, depth - 1, -beta, -alpha, ply + 1)
+            chessboard.unmake_move()
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not capture and move.promotion is None:
+                    killers = self.killers[ply]
+                    if move != killers[0]: killers[0], killers[1] = move, killers[0]
+                break
+
+        if not ply: self.root_move = best_move
+        if best_score >= beta: bound = LOWER
+        elif best_score > original_alpha: bound = EXACT
+        else: bound = UPPER
+        stored = best_score
+        if stored > MATE_BOUND: stored += ply
+        elif stored < -MATE_BOUND: stored -= ply
+        self.table.store(key, depth, stored, bound, best_move)
+        return best_score
+
+    def _quiesce(self, chessboard, alpha, beta, ply):
+        '''
+            Resolve captures and promotions before trusting evaluate()
+        '''
+        moves = chessboard.legal_moves()
+        if not moves:
+            if chessboard.is_in_check(chessboard.player_turn): return -MATE + ply
+            return 0
+
+        stand_pat = evaluate(chessboard)
+        if stand_pat >= beta or ply >= MAX_DEPTH: return stand_pat
+        if stand_pat > alpha: alpha = stand_pat
+
+        squares = chessboard.squares
+        tactical = [move for move in moves
+                    if squares[move.to] is not None or move.promotion is not None]
+        for move in self._order(chessboard, tactical, None, ply):
+            self.nodes += 1
+            self._check_limits()
+            chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+            score = -self._quiesce(chessboard, -beta, -alpha, ply + 1)
+            chessboard.unmake_move()
+            if score >= beta: return score
+            if score > alpha: alpha = score
+        return alpha
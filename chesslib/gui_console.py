@@ -1,6 +1,14 @@
 # -*- encoding: utf-8 -*-
+'''
+    Console front end
+
+        python -m chesslib.gui_console                # play on the terminal
+        python -m chesslib.gui_console moves.txt      # replay a file of moves
+'''
 from . import board
-import os
+from . import coords
+import argparse
+import sys
 
 UNICODE_PIECES = {
   'r': '♜', 'n': '♞', 'b': '♝', 'q': '♛',
@@ -9,51 +17,141 @@ UNICODE_PIECES = {
   None: ' '
 }
 
+PROMPT = 'State a move in chess notation (e.g. A2A3). Type "exit" to leave:'
+
+# Screen layout, terminal lines and columns count from 1
+TITLE_LINE = 1
+RANK_8_LINE = 3
+FILES_LINE = RANK_8_LINE + 8
+MESSAGE_LINE = FILES_LINE + 2
+PROMPT_LINE = MESSAGE_LINE + 1
+INPUT_LINE = PROMPT_LINE + 1
+FILE_A_COLUMN = 5
+SQUARE_WIDTH = 3
+
+CLEAR_SCREEN = '\x1b[2J'
+CLEAR_LINE = '\x1b[K'
+
+
+def goto(line, column=1):
+    return '\x1b[%d;%dH' % (line, column)
+
+
 class BoardGuiConsole(object):
     '''
-        Print a text-mode chessboard using the unicode chess pieces
+        Text-mode chessboard using the unicode chess pieces. On a
+        terminal the first frame is drawn whole and later frames only
+        rewrite the squares and lines that changed, using ANSI cursor
+        moves. Every frame goes out in a single write. When the output
+        is not a terminal each frame is written whole as plain text.
     '''
     error = ''
 
-    def __init__(self, chessboard):
+    def __init__(self, chessboard, output=None, ansi=None):
         self.board = chessboard
+        self.output = output or sys.stdout
+        self.ansi = self.output.isatty() if ansi is None else ansi
+        self.shown = None  # glyph on every square as last drawn
+        self.shown_lines = None
+
+    def glyphs(self):
+        return [UNICODE_PIECES[piece.abbreviation if piece is not None else None]
+                for piece in self.board.squares]
+
+    def lines(self):
+        ''' The text lines around the board, by screen line '''
+        return {
+            TITLE_LINE: ("%s's turn" % self.board.player_turn.capitalize()).center(28),
+            MESSAGE_LINE: self.error,
+            PROMPT_LINE: PROMPT,
+        }
+
+    def full_frame(self, glyphs, lines):
+        screen = [''] * INPUT_LINE
+        for line, text in lines.items():
+            screen[line - 1] = text
+        for row in range(8):
+            squares = glyphs[row * 8:row * 8 + 8]
+            screen[RANK_8_LINE + 7 - row - 1] = ' %d  ' % (row + 1) + ''.join(
+                glyph.ljust(SQUARE_WIDTH) for glyph in squares)
+        screen[FILES_LINE - 1] = ' ' * (FILE_A_COLUMN - 1) + '  '.join(coords.FILES)
+        screen[INPUT_LINE - 1] = '>>> '
+        frame = '\n'.join(screen)
+        if self.ansi: frame = CLEAR_SCREEN + goto(1) + frame
+        return frame
 
-    def move(self):
-        os.system("clear")
-        self.unicode_representation()
-        print("\n", self.error)
-        print("State a move in chess notation (e.g. A2A3). Type \"exit\" to leave:\n", ">>>", end=' ')
+    def changes(self, glyphs, lines):
+        parts = []
+        for index, glyph in enumerate(glyphs):
+            if glyph != self.shown[index]:
+                row, col = coords.ROW_COLS[index]
+                parts.append(goto(RANK_8_LINE + 7 - row, FILE_A_COLUMN + SQUARE_WIDTH * col) + glyph)
+        for line, text in lines.items():
+            if text != self.shown_lines[line]:
+                parts.append(goto(line) + text + CLEAR_LINE)
+        parts.append(goto(INPUT_LINE) + CLEAR_LINE + '>>> ')
+        return ''.join(parts)
+
+    def render(self):
+        glyphs, lines = self.glyphs(), self.lines()
+        if self.shown is None or not self.ansi:
+            frame = self.full_frame(glyphs, lines)
+        else:
+            frame = self.changes(glyphs, lines)
+        self.shown, self.shown_lines = glyphs, lines
+        self.output.write(frame)
+        self.output.flush()
+
+    def play(self, command):
         self.error = ''
-        coord = input()
-        if coord == "exit":
-            print("Bye.")
-            exit(0)
         try:
-            if len(coord) != 4: raise board.InvalidCoord
-            self.board.move(coord[0:2], coord[2:4])
-            os.system("clear")
+            if len(command) != 4: raise board.InvalidCoord
+            self.board.move(command[0:2], command[2:4])
         except board.ChessError as error:
             self.error = "Error: %s" % error.__class__.__name__
 
-        self.move()
-
-    def unicode_representation(self):
-        print("\n", ("%s's turn\n" % self.board.player_turn.capitalize()).center(28))
-        for number in self.board.axis_x[::-1]:
-            print(" " + str(number) + " ", end=' ')
-            for letter in self.board.axis_y:
-                piece = self.board[letter+str(number)]
-                if piece is not None:
-                    print(UNICODE_PIECES[piece.abbreviation] + ' ', end=' ')
-                else: print('  ', end=' ')
-            print("\n")
-        print("    " + "  ".join(self.board.axis_y))
+    def run(self, commands=None):
+        '''
+            Play moves until "exit" or the end of `commands`, an iterable
+            of lines such as an open file of moves. Without `commands`
+            moves are read from stdin.
+        '''
+        scripted = commands is not None
+        if not scripted: commands = iter(input, None)
+        self.render()
+        for command in commands:
+            command = command.strip()
+            if scripted: self.output.write(command + '\n')
+            if command == "exit": break
+            if not command or command.startswith('#'): continue
+            self.play(command)
+            self.render()
+        self.output.write("\nBye.\n")
 
 
-def display(board):
+def display(chessboard, moves=None):
+    '''
+        Play on the console, or replay the file named `moves`
+    '''
+    gui = BoardGuiConsole(chessboard)
     try:
-        gui = BoardGuiConsole(board)
-        gui.move()
+        if moves is None:
+            gui.run()
+        else:
+            with open(moves) as commands:
+                gui.run(commands)
     except (KeyboardInterrupt, EOFError):
-        os.system("clear")
-        exit(0)
+        gui.output.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play or replay a game on the console')
+    parser.add_argument('moves', nargs='?', help='file with one move per line (e.g. E2E4)')
+    parser.add_argument('--fen', default=None, help='starting position')
+    args = parser.parse_args(argv)
+    display(board.Board(args.fen), args.moves)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
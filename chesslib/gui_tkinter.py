@@ -1,22 +1,143 @@
 from . import board
+from . import coords
+from . import engine
 from . import pieces
+from . import record
+import os
+import queue
+import threading
 import tkinter as tk
-from PIL import ImageTk
+import traceback
+from PIL import Image, ImageTk
 
 color1 = 'brown'
 color2 = 'white'
 
+ENGINE_LIMIT = engine.Limit(time=1.0)
+POLL_INTERVAL = 20  # ms between checks for finished background jobs
+IMAGE_DIRECTORY = 'img'
+
 
 def get_color_from_coords(coords):
     return [color1, color2][(coords[0] - coords[1]) % 2]
 
 
+def legal_targets(chessboard, index):
+    '''(row, col) of every square the piece on `index` can move to'''
+    return [coords.ROW_COLS[move.to] for move in chessboard.legal_moves()
+            if move.from_ == index]
+
+
+def check_status(chessboard):
+    '''
+        Return (key, square) where square is the side to move's king
+        square if it is in check, else None
+    '''
+    color = chessboard.player_turn
+    king = chessboard.king_square(color)
+    if king is not None and chessboard.is_square_attacked(king, chessboard.get_enemy(color)):
+        return chessboard.key, king
+    return chessboard.key, None
+
+
+class SpriteCache(object):
+    '''
+        Piece images for the canvas. Each PNG is decoded once, on first
+        use, and scaled with PIL to the square size. The PhotoImages are
+        kept per (piece, size); asking for a new size drops those of the
+        old one, so a resize never reads or decodes a file again.
+    '''
+
+    def __init__(self, directory=IMAGE_DIRECTORY):
+        self.directory = directory
+        self.sources = {}  # piece -> decoded PIL image
+        self.images = {}   # (piece, size) -> PhotoImage
+        self.size = None
+
+    def source(self, piece):
+        image = self.sources.get(piece)
+        if image is None:
+            filename = "%s%s.png" % (piece.color, piece.abbreviation.lower())
+            with Image.open(os.path.join(self.directory, filename)) as opened:
+                image = self.sources[piece] = opened.convert('RGBA')
+        return image
+
+    def get(self, piece, size):
+        key = (piece, size)
+        photo = self.images.get(key)
+        if photo is None:
+            if size != self.size:
+                self.images = {}
+                self.size = size
+            scaled = self.source(piece).resize((size, size), Image.LANCZOS)
+            photo = self.images[key] = ImageTk.PhotoImage(scaled)
+        return photo
+
+
+class Worker(object):
+    '''
+        Runs jobs on a daemon thread so the Tk event loop never waits for
+        move generation or the engine. submit() returns at once; poll(),
+        rescheduled with after(), hands each finished job's result to its
+        callback on the Tk thread, or the exception a job raised to its
+        `failed` callback. cancel() discards every cancellable job that
+        has not been delivered yet.
+    '''
+
+    def __init__(self, widget, interval=POLL_INTERVAL):
+        self.widget = widget
+        self.interval = interval
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        threading.Thread(target=self.run, daemon=True).start()
+        widget.after(interval, self.poll)
+
+    def submit(self, function, args, callback, cancellable=True, failed=None):
+        generation = self.generation if cancellable else None
+        self.jobs.put((generation, function, args, callback, failed))
+
+    def cancel(self):
+        self.generation += 1
+
+    def cancelled(self, generation):
+        return generation is not None and generation != self.generation
+
+    def run(self):
+        while True:
+            generation, function, args, callback, failed = self.jobs.get()
+            if self.cancelled(generation): continue
+            try:
+                result = function(*args)
+            except Exception as error:
+                traceback.print_exc()
+                if failed is None: continue
+                callback, result = failed, error
+            self.results.put((generation, callback, result))
+
+    def poll(self):
+        try:
+            while True:
+                generation, callback, result = self.results.get_nowait()
+                if not self.cancelled(generation): callback(result)
+        except queue.Empty:
+            pass
+        finally:
+            self.widget.after(self.interval, self.poll)
+
+
 class BoardGuiTk(tk.Frame):
-    pieces = {}
+    '''
+        The canvas holds one rectangle and one image item per square,
+        created once. Moves and selections only reconfigure the items of
+        squares whose colour or piece changed, see render().
+    '''
     selected = None
     selected_piece = None
     highlighted = None
-    icons = {}
+    check_square = None
+    thinking = False
+    game_over = False
 
     rows = 8
     columns = 8
@@ -26,7 +147,7 @@ class BoardGuiTk(tk.Frame):
         return (self.columns * self.square_size,
                 self.rows * self.square_size)
 
-    def __init__(self, parent, chessboard, square_size=64):
+    def __init__(self, parent, chessboard, square_size=64, engine_color=None):
         self.color1 = color1
         self.color2 = color2
         self.chessboard = chessboard
@@ -35,6 +156,8 @@ class BoardGuiTk(tk.Frame):
         self.from_square = None
         self.to_square = None
         self.prompting = False
+        self.engine_color = engine_color
+        self.engine = engine.Engine() if engine_color is not None else None
 
         canvas_width = self.columns * square_size
         canvas_height = self.rows * square_size
@@ -44,6 +167,16 @@ class BoardGuiTk(tk.Frame):
         self.canvas = tk.Canvas(self, width=canvas_width, height=canvas_height, background="grey")
         self.canvas.pack(side="top", fill="both", anchor="center", expand=True)
 
+        # square index -> canvas item, and what each item currently shows
+        self.square_items = [self.canvas.create_rectangle(0, 0, 0, 0, outline="black", tags="square")
+                             for index in range(64)]
+        self.piece_items = [self.canvas.create_image(0, 0, anchor="c", state="hidden", tags="piece")
+                            for index in range(64)]
+        self.fills = [None] * 64
+        self.shown = [None] * 64
+        self.sprites = SpriteCache()
+        self.layout()
+
         self.canvas.bind("<Configure>", self.refresh)
         self.canvas.bind("<Button-1>", self.click)
 
@@ -57,22 +190,47 @@ class BoardGuiTk(tk.Frame):
 
         self.statusbar.pack(expand=False, fill="x", side='bottom')
 
+        self.worker = Worker(self)
+        self.position_changed()
+
+    def layout(self):
+        '''Move every item to its square for the current square_size'''
+        size = self.square_size
+        for index, (row, col) in enumerate(coords.ROW_COLS):
+            x, y = col * size, (7-row) * size
+            self.canvas.coords(self.square_items[index], x, y, x + size, y + size)
+            self.canvas.coords(self.piece_items[index], x + size // 2, y + size // 2)
+
+    def square_color(self, index):
+        coord = coords.ROW_COLS[index]
+        if index == self.check_square:
+            return 'red'
+        if self.highlighted is not None and coord in self.highlighted:
+            return 'spring green'
+        if coord in (self.from_square, self.to_square):
+            return 'tan1'
+        if coord == self.selected:
+            return 'orange'
+        return get_color_from_coords(coord)
+
+    def render(self):
+        '''Bring the canvas up to date, touching only the squares that changed'''
+        squares = self.chessboard.squares
+        for index in range(64):
+            color = self.square_color(index)
+            if color != self.fills[index]:
+                self.redraw_square(coords.ROW_COLS[index], color)
+            piece = squares[index]
+            if piece is not self.shown[index]:
+                self.draw_piece(piece, *coords.ROW_COLS[index])
+
     def redraw_square(self, coord, color=None):
-        row, col = coord
         if color is None:
             color = get_color_from_coords(coord)
+        index = coords.index(coord)
+        self.canvas.itemconfig(self.square_items[index], fill=color)
+        self.fills[index] = color
 
-        x1 = (col * self.square_size)
-        y1 = ((7-row) * self.square_size)
-        x2 = x1 + self.square_size
-        y2 = y1 + self.square_size
-        self.canvas.create_rectangle(x1, y1, x2, y2, outline="black", fill=color, tags="square")
-
-        # see if we need to redraw a piece
-        piece = self.chessboard[(row, col)]
-        if piece is not None:
-            self.draw_piece(piece, row, col)
-    
     def click(self, event):
 
         # Figure out which square we've clicked
@@ -80,50 +238,24 @@ class BoardGuiTk(tk.Frame):
 
         current_column = int(event.x / col_size)
         current_row = int(8 - (event.y / row_size))
-        position = self.chessboard.letter_notation((current_row, current_column))
-        piece = self.chessboard[position]
-        if self.from_square is not None:  # on the second click, redraw
-            self.redraw_square(self.from_square)
-            self.redraw_square(self.to_square)
+        position = coords.name((current_row, current_column))
+        if position is None or self.thinking or self.game_over: return
+        self.worker.cancel()  # drop highlights still being computed
 
         if self.selected_piece:  # on the second click, move
             self.move(self.selected_piece[1], position)
+            self.engine_move()
             self.selected_piece = None
-            self.highlighted = None
-            self.pieces = {}
-            self.refresh()
-            self.draw_pieces()
-
-        else:  # remove previous highlighting
-            self.highlighted = None
+        self.highlighted = None
         self.highlight(position)
-        self.refresh()
-
-        if self.from_square is not None:
-            self.redraw_square(self.from_square, 'tan1')
-            self.redraw_square(self.to_square, 'tan1')
-        if self.highlighted is not None:
-            for square in self.highlighted:
-                self.redraw_square(square, 'spring green')
-        enemy = self.chessboard.player_turn
-        if self.chessboard.is_in_check(enemy):
-            algebraic_pos = self.chessboard.get_king_position(enemy)
-            enemy_king_loc = self.chessboard.number_notation(algebraic_pos)
-            self.redraw_square(enemy_king_loc, 'red')
+        self.render()
 
     def move(self, p1, p2):
         
         piece = self.chessboard[p1]
-        enemy = self.chessboard.get_enemy(piece.color)
         dest_piece = self.chessboard[p2]
         if dest_piece is None or dest_piece.color != piece.color:
             try:
-                if self.from_square:
-                    self.redraw_square(self.from_square)
-
-                if self.to_square:
-                    self.redraw_square(self.to_square)
-
                 if isinstance(piece, pieces.Pawn) and p2[1] in '18':
 
                     promote = 'R'
@@ -132,115 +264,136 @@ class BoardGuiTk(tk.Frame):
                     promote = None
 
                 self.chessboard.move(p1, p2, promote=promote)
-                self.from_square = self.chessboard.number_notation(p1)
-                self.to_square = self.chessboard.number_notation(p2)
-                self.redraw_square(self.from_square, 'tan1')
-                self.redraw_square(self.to_square, 'tan1')
-
-                if self.chessboard.is_in_check(enemy):
-                    algebraic_pos = self.chessboard.get_king_position(enemy)
-                    enemy_king_loc = self.chessboard.number_notation(algebraic_pos)
-                    self.redraw_square(enemy_king_loc, 'red')
-                
+
             except board.InvalidMove as error:
                 self.highlighted = []
+            except (board.CheckMate, board.Draw) as error:
+                # raised after the move was made, it ended the game
+                self.game_over = True
+                self.moved(piece, p1, p2, " ".join((error.__class__.__name__,) + error.args))
             except board.ChessError as error:
                 print('ChessError', error.__class__.__name__)
                 self.label_status["text"] = error.__class__.__name__
-                self.refresh()
+                self.render()
                 raise
             else:
-                self.label_status["text"] = " " + piece.color.capitalize() + ": " + p1 + p2
+                self.moved(piece, p1, p2)
+
+    def moved(self, piece, p1, p2, outcome=''):
+        '''Show the move just made on the board, and how it ended the game'''
+        self.from_square = coords.ROW_COLS[coords.index(p1)]
+        self.to_square = coords.ROW_COLS[coords.index(p2)]
+        self.label_status["text"] = " " + piece.color.capitalize() + ": " + p1 + p2 + \
+            ("  " + outcome if outcome else "")
+        self.position_changed()
+
+    def snapshot(self):
+        '''A copy of the board for background jobs to search'''
+        return self.chessboard.copy()
+
+    def position_changed(self):
+        self.worker.submit(check_status, (self.snapshot(),), self.show_check, cancellable=False)
+
+    def show_check(self, status):
+        key, square = status
+        if key == self.chessboard.key:
+            self.check_square = square
+            self.render()
+
+    def engine_move(self):
+        '''Start the engine thinking if it is its turn, it plays when done'''
+        if self.engine is None or self.game_over or \
+           self.chessboard.player_turn != self.engine_color:
+            return
+        # Clicks are ignored while the engine thinks, so only reset()
+        # cancels this job
+        self.thinking = True
+        self.worker.submit(self.engine.best_move, (self.snapshot(), ENGINE_LIMIT),
+                           self.play_engine_move, failed=self.engine_failed)
+
+    def engine_failed(self, error):
+        self.thinking = False
+        self.label_status["text"] = error.__class__.__name__
+        self.render()
+
+    def play_engine_move(self, move):
+        self.thinking = False
+        if move is not None:
+            self.move(board.SQUARES[move.from_], board.SQUARES[move.to])
+        self.render()
 
     def highlight(self, pos):
         piece = self.chessboard[pos]
         if piece is not None and (piece.color == self.chessboard.player_turn):
             self.selected_piece = (self.chessboard[pos], pos)
-            possible_moves = self.chessboard[pos].possible_moves(pos)
-            possible_moves = [m for m in possible_moves if
-                              not self.chessboard.is_in_check_after_move(pos, m)]
-            self.highlighted = list(map(self.chessboard.number_notation, possible_moves))
-
-    def addpiece(self, name, image, row=0, column=0):
-        '''Add a piece to the playing board'''
-        # self.canvas.create_image(0,0, image=image, tags=(name, "piece"), anchor="c")
-        x = ((column + .5) * self.square_size)
-        y = ((7-(row - .5)) * self.square_size)
-
-        self.canvas.create_image(x, y, image=image, tags=(name, "piece"), anchor="c")
-        self.placepiece(name, row, column)
-
-    def placepiece(self, name, row, column):
-        '''Place a piece at the given row/column'''
-        self.pieces[name] = (row, column)
-        x0 = (column * self.square_size) + int(self.square_size/2)
-        y0 = ((7-row) * self.square_size) + int(self.square_size/2)
-        self.canvas.coords(name, x0, y0)
+            self.highlighted = []
+            self.worker.submit(legal_targets, (self.snapshot(), coords.index(pos)),
+                               self.show_highlights)
+
+    def show_highlights(self, targets):
+        self.highlighted = targets
+        self.render()
 
     def refresh(self, event={}):
-        '''Redraw the board'''
+        '''Fit the board to the canvas after a resize'''
         if event:
             xsize = int((event.width-1) / self.columns)
             ysize = int((event.height-1) / self.rows)
-            self.square_size = min(xsize, ysize)
-
-        self.canvas.delete("square")
-        color = self.color2
-        for row in range(self.rows):
-            color = self.color1 if color == self.color2 else self.color2
-            for col in range(self.columns):
-                x1 = (col * self.square_size)
-                y1 = ((7-row) * self.square_size)
-                x2 = x1 + self.square_size
-                y2 = y1 + self.square_size
-                if (self.selected is not None) and (row, col) == self.selected:
-                    self.redraw_square((row, col), 'orange')
-                elif self.highlighted is not None and (row, col) in self.highlighted:
-                    self.redraw_square((row, col), 'spring green')
-                else:
-                    self.redraw_square((row, col), color)
-                color = self.color1 if color == self.color2 else self.color2
-        for name in self.pieces:
-            self.placepiece(name, self.pieces[name][0], self.pieces[name][1])
-        self.canvas.tag_raise("piece")
-        self.canvas.tag_lower("square")
+            size = min(xsize, ysize)
+            if size != self.square_size:
+                self.square_size = size
+                self.layout()
+                # sprites of the old size are gone, show every piece again
+                self.shown = [None] * 64
+        self.render()
 
     def draw_piece(self, piece, row, col):
-        x = (col * self.square_size)
-        y = ((7-row) * self.square_size)
-        filename = "img/%s%s.png" % (piece.color, piece.abbreviation.lower())
-        piecename = "%s%s%s" % (piece.abbreviation, x, y)
-        
-        if filename not in self.icons:
-            self.icons[filename] = ImageTk.PhotoImage(file=filename, width=32, height=32)
-        self.addpiece(piecename, self.icons[filename], row, col)
-        # self.placepiece(piecename, row, col)
+        index = row * 8 + col
+        item = self.piece_items[index]
+        if piece is None:
+            self.canvas.itemconfig(item, state="hidden")
+        else:
+            image = self.sprites.get(piece, self.square_size)
+            self.canvas.itemconfig(item, image=image, state="normal")
+        self.shown[index] = piece
 
     def draw_pieces(self):
-        self.canvas.delete("piece")
-        
-        for coord, piece in self.chessboard.items():
-            if piece is not None:
-                x, y = self.chessboard.number_notation(coord)
-                self.draw_piece(piece, x, y)
+        self.render()
 
     def reset(self):
+        self.worker.cancel()  # the engine's reply, if any, is dropped
+        if self.thinking:
+            self.engine.stop()
+            self.thinking = False
+        self.game_over = False
         self.chessboard.load(board.FEN_STARTING)
-        self.refresh()
-        self.draw_pieces()
-        self.refresh()
-
-
-def display(chessboard):
-    root = tk.Tk()
-    root.title("Эндшпиль")
-
-    gui = BoardGuiTk(root, chessboard)
-    gui.pack(side="top", fill="both", expand=1, padx=4, pady=4)
-    gui.draw_pieces()
-
-    root.resizable(False, False)
-    root.mainloop()
+        recorder = self.chessboard.recorder
+        if recorder is not None: recorder.follow(self.chessboard)  # a new game
+        self.from_square = self.to_square = None
+        self.selected_piece = self.highlighted = None
+        self.render()
+
+
+def display(chessboard, engine_color=None, record_path=None):
+    '''
+        Play on `chessboard` in a Tk window. With `record_path` the game
+        is appended move by move to that binary game record.
+    '''
+    games = record.GameRecord(record_path) if record_path is not None else None
+    try:
+        if games is not None: games.follow(chessboard)
+        root = tk.Tk()
+        root.title("Эндшпиль")
+
+        gui = BoardGuiTk(root, chessboard, engine_color=engine_color)
+        gui.pack(side="top", fill="both", expand=1, padx=4, pady=4)
+        gui.engine_move()
+        gui.render()
+
+        root.resizable(False, False)
+        root.mainloop()
+    finally:
+        if games is not None: games.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+'''
+    Opt-in call counting and timing for the hot paths of Board and the
+    pieces.
+
+        with instrument.instrumented() as stats:
+            chessboard.move('E2', 'E4')
+        print(instrument.format_report(stats))
+
+    enable() replaces the methods listed in TARGETS with counting
+    wrappers and disable() puts the originals back, so the code runs
+    untouched while instrumentation is off. Times are inclusive: a call
+    to Board.move also counts towards the _do_move it makes.
+'''
+from functools import wraps
+from time import perf_counter
+
+from . import board
+from . import pieces
+
+
+TARGETS = (
+    (board.Board, 'move'),
+    (board.Board, '_do_move'),
+    (board.Board, 'is_in_check'),
+    (board.Board, 'is_in_check_after_move'),
+    (board.Board, 'all_possible_moves'),
+    (board.Board, 'export'),
+    (pieces.Pawn, 'possible_moves'),
+    (pieces.Rook, 'possible_moves'),
+    (pieces.King, 'possible_moves'),
+)
+
+# "Class.method" -> [calls, seconds]
+counters = dict(('%s.%s' % (owner.__name__, name), [0, 0.0]) for owner, name in TARGETS)
+
+# (owner, name, attribute in the owner's own __dict__ or None) while enabled
+_originals = []
+
+
+def _counting(function, counter):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += perf_counter() - start
+    return wrapper
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def enable():
+    if _originals: return
+    for owner, name in TARGETS:
+        counter = counters['%s.%s' % (owner.__name__, name)]
+        _originals.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, _counting(getattr(owner, name), counter))
+
+
+def disable():
+    while _originals:
+        owner, name, original = _originals.pop()
+        if original is None: delattr(owner, name)  # it was inherited
+        else: setattr(owner, name, original)
+
+
+def reset():
+    for counter in counters.values():
+        counter[0], counter[1] = 0, 0.0
+
+
+def snapshot():
+    '''
+        Return {"Class.method": (calls, seconds)}
+    '''
+    return dict((name, tuple(counter)) for name, counter in counters.items())
+
+
+class instrumented(object):
+    '''
+        Context manager that resets the counters, enables
+        instrumentation and disables it again on exit. The dict it
+        returns is filled in with the snapshot() taken on exit.
+    '''
+
+    def __enter__(self):
+        reset()
+        enable()
+        self.stats = {}
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        disable()
+        self.stats.update(snapshot())
+
+
+def format_report(stats=None):
+    if stats is None: stats = snapshot()
+    lines = ['%-32s %10s %10s %10s' % ('function', 'calls', 'seconds', 'us/call')]
+    for name, (calls, seconds) in sorted(stats.items(), key=lambda item: -item[1][1]):
+        per_call = seconds / calls * 1e6 if calls else 0.0
+        lines.append('%-32s %10d %10.4f %10.2f' % (name, calls, seconds, per_call))
+    return '\n'.join(lines)
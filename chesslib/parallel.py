@@ -0,0 +1,60 @@
+'''
+    Process pool drivers for CPU bound sweeps over many positions.
+
+    Work is sent to the workers as compact encodings (FEN strings, table
+    block numbers) and results come back as plain bytes, numbers and
+    dicts, never as pickled Board or Piece objects. Results are always
+    yielded in input order so runs are deterministic whatever the number
+    of workers.
+
+    imap_bounded and chunked are shared by the tablebase generator here
+    and by analyse.py, pgn.py and selfplay.py.
+'''
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+import os
+
+from . import tablebase
+
+
+def imap_bounded(executor, function, iterable, window=None):
+    '''
+        Like executor.map, but consumes `iterable` lazily and keeps at
+        most `window` tasks in flight, so memory stays bounded however
+        long the input is
+    '''
+    if window is None: window = 2 * (os.cpu_count() or 1)
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk: return
+        yield chunk
+
+
+def generate_tablebase(signature, directory=tablebase.DEFAULT_DIRECTORY, workers=None):
+    '''
+        tablebase.generate with the forward pass spread over `workers`
+        processes, one block (side to move and white king square) per task
+    '''
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        def scan_blocks(signature, blocks, directory):
+            scan = partial(_scan_block, signature, directory)
+            return imap_bounded(executor, scan, blocks, 2 * workers)
+        return tablebase.generate(signature, directory, scan_blocks)
+
+
+def _scan_block(signature, directory, block):
+    return tablebase.scan(signature, block, directory)
@@ -0,0 +1,186 @@
+'''
+    Perft node counts and move generator benchmarks
+
+    python -m chesslib.perft 3                     perft of FEN_STARTING to depth 3
+    python -m chesslib.perft --fen "..." --divide 2
+    python -m chesslib.perft --check               verify the node counts below
+    python -m chesslib.perft --bench               hot path calls per second
+'''
+import argparse
+import time
+
+from . import board
+
+
+# Endgame positions for the supported material, with known perft results
+# (depth -> nodes) cross-checked against reference_perft.
+POSITIONS = {
+    'start': (board.FEN_STARTING, {1: 7, 2: 98, 3: 681, 4: 12144}),
+    'KPK':   ('8/8/8/4k3/8/8/4P3/4K3 w - - 0 1', {1: 6, 2: 44, 3: 294, 4: 2100}),
+    'KRK':   ('8/8/8/4k3/8/8/8/R3K3 w - - 0 1', {1: 15, 2: 109, 3: 1971, 4: 13224}),
+    'KRKP':  ('8/8/3k4/8/8/2p5/8/R3K3 b - - 0 1', {1: 9, 2: 126, 3: 1018, 4: 16459}),
+}
+
+
+def perft(chessboard, depth):
+    '''
+        Count the leaf nodes of the legal move tree `depth` plies deep
+    '''
+    if depth == 0: return 1
+    moves = chessboard.legal_moves()
+    if depth == 1: return len(moves)
+    nodes = 0
+    for move in moves:
+        chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+        nodes += perft(chessboard, depth - 1)
+        chessboard.unmake_move()
+    return nodes
+
+
+def divide(chessboard, depth):
+    '''
+        Return a list of (move, nodes) pairs, one per legal root move
+    '''
+    result = []
+    for move in chessboard.legal_moves():
+        chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+        result.append((move, perft(chessboard, depth - 1)))
+        chessboard.unmake_move()
+    return result
+
+
+def reference_perft(chessboard, depth):
+    '''
+        Same as perft, but built on possible_moves and is_in_check_after_move
+        so it shares as little code as possible with legal_moves
+    '''
+    if depth == 0: return 1
+    nodes = 0
+    color = chessboard.player_turn
+    for p1 in chessboard.occupied(color):
+        for p2 in chessboard[p1].possible_moves(chessboard, p1):
+            if chessboard.is_in_check_after_move(p1, p2): continue
+            chessboard.make_move(p1, p2)
+            nodes += reference_perft(chessboard, depth - 1)
+            chessboard.unmake_move()
+    return nodes
+
+
+def check(max_depth=3):
+    '''
+        Compare perft and reference_perft with the known results,
+        return a list of mismatch descriptions (empty if all is well)
+    '''
+    errors = []
+    for name, (fen, expected) in sorted(POSITIONS.items()):
+        for depth, nodes in sorted(expected.items()):
+            if depth > max_depth: continue
+            found = perft(board.Board(fen), depth)
+            reference = reference_perft(board.Board(fen), depth)
+            if not found == reference == nodes:
+                errors.append('%s depth %d: expected %d, perft %d, reference %d'
+                              % (name, depth, nodes, found, reference))
+    return errors
+
+
+def _bench_possible_moves(chessboard, fen):
+    calls = 0
+    for index in sorted(chessboard.occupancy['white'] | chessboard.occupancy['black']):
+        chessboard[index].possible_moves(chessboard, board.SQUARES[index])
+        calls += 1
+    return calls
+
+
+def _bench_is_in_check(chessboard, fen):
+    chessboard.is_in_check('white')
+    chessboard.is_in_check('black')
+    return 2
+
+
+def _bench_move(chessboard, fen):
+    calls = 0
+    for move in chessboard.legal_moves():
+        try:
+            chessboard.move(board.SQUARES[move.from_], board.SQUARES[move.to])
+        except board.ChessError:
+            pass
+        chessboard.unmake_move()
+        calls += 1
+    return calls
+
+
+def _bench_load(chessboard, fen):
+    chessboard.load(fen)
+    return 1
+
+
+def _bench_export(chessboard, fen):
+    chessboard.fen = None  # time the serializer, not the cache
+    chessboard.export()
+    return 1
+
+
+BENCHMARKS = (
+    ('possible_moves', _bench_possible_moves),
+    ('is_in_check', _bench_is_in_check),
+    ('move', _bench_move),
+    ('load', _bench_load),
+    ('export', _bench_export),
+)
+
+
+def bench(seconds=0.5):
+    '''
+        Run every benchmark over every position for about `seconds`
+        each, return a list of (benchmark, position, calls per second)
+    '''
+    result = []
+    for name, function in BENCHMARKS:
+        for position, (fen, expected) in sorted(POSITIONS.items()):
+            chessboard = board.Board(fen)
+            calls = 0
+            start = time.perf_counter()
+            deadline = start + seconds
+            while time.perf_counter() < deadline:
+                calls += function(chessboard, fen)
+            result.append((name, position, calls / (time.perf_counter() - start)))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft and move generator benchmarks')
+    parser.add_argument('depth', type=int, nargs='?', default=3)
+    parser.add_argument('--fen', default=board.FEN_STARTING)
+    parser.add_argument('--divide', action='store_true', help='show node counts per root move')
+    parser.add_argument('--check', action='store_true', help='verify the known perft results')
+    parser.add_argument('--bench', action='store_true', help='measure hot path throughput')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        errors = check(args.depth)
+        for error in errors: print(error)
+        print('FAILED' if errors else 'OK')
+        return 1 if errors else 0
+
+    if args.bench:
+        for name, position, rate in bench():
+            print('%-15s %-6s %12.0f calls/s' % (name, position, rate))
+        return 0
+
+    chessboard = board.Board(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        nodes = 0
+        for move, count in divide(chessboard, args.depth):
+            print('%s: %d' % (move, count))
+            nodes += count
+    else:
+        nodes = perft(chessboard, args.depth)
+    elapsed = time.perf_counter() - start
+    print('Nodes: %d' % nodes)
+    print('Time: %.3fs (%.0f nodes/s)' % (elapsed, nodes / max(elapsed, 1e-9)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
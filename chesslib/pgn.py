@@ -0,0 +1,268 @@
+'''
+    PGN import and export
+
+        with open('games.pgn', 'a') as stream:
+            write_game(stream, chessboard, {'White': 'Alice'})
+
+        with open('games.pgn') as stream:
+            for game in read_games(stream):
+                chessboard = replay(game)
+
+    read_games() is a generator that holds one game in memory at a time,
+    so collections of any size can be read. validate() replays them in
+    worker processes:
+
+        python -m chesslib.pgn games.pgn --workers 4
+'''
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import re
+import sys
+
+from . import board
+from . import parallel
+
+
+class PGNError(board.ChessError): pass
+
+
+# One game as read: tags in file order and the SAN moves of the main line
+Game = namedtuple('Game', ('tags', 'moves', 'result'))
+
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+LINE_LENGTH = 79
+
+TAG_REGEX = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+# comments, variations and NAGs are skipped, everything else is a token
+TOKEN_REGEX = re.compile(r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|[^\s{}();]+')
+MOVE_NUMBER_REGEX = re.compile(r'^\d+\.+$')
+SAN_SUFFIXES = '+#!?'
+
+
+def _san(chessboard, move, moves):
+    '''
+        SAN of `move` without the check suffix; `moves` are all the
+        legal moves of the position
+    '''
+    squares = chessboard.squares
+    piece = squares[move.from_]
+    dest = board.SQUARES[move.to].lower()
+    capture = squares[move.to] is not None
+    if chessboard.is_pawn(piece):
+        text = board.SQUARES[move.from_][0].lower() + 'x' + dest if capture else dest
+        if move.promotion is not None: text += '=' + move.promotion.upper()
+        return text
+
+    letter = piece.abbreviation.upper()
+    rivals = [other.from_ for other in moves if other.to == move.to and
+              other.from_ != move.from_ and squares[other.from_] is piece]
+    origin = board.SQUARES[move.from_].lower()
+    if not rivals: disambiguation = ''
+    elif all(rival % 8 != move.from_ % 8 for rival in rivals): disambiguation = origin[0]
+    elif all(rival // 8 != move.from_ // 8 for rival in rivals): disambiguation = origin[1]
+    else: disambiguation = origin
+    return letter + disambiguation + ('x' if capture else '') + dest
+
+
+def san(chessboard, move):
+    '''
+        Standard algebraic notation of `move` in the current position
+    '''
+    text = _san(chessboard, move, chessboard.legal_moves())
+    chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+    try:
+        if chessboard.is_in_check(chessboard.player_turn):
+            text += '#' if not chessboard.legal_moves() else '+'
+    finally:
+        chessboard.unmake_move()
+    return text
+
+
+def parse_san(chessboard, text):
+    '''
+        Return the legal Move written as `text` in the current position
+    '''
+    moves = chessboard.legal_moves()
+    wanted = text.rstrip(SAN_SUFFIXES)
+    for move in moves:
+        if _san(chessboard, move, moves) == wanted:
+            return move
+    raise PGNError(text)
+
+
+def result(chessboard):
+    '''
+        The PGN result of the game on `chessboard`, '*' while it goes on
+    '''
+    if not chessboard.legal_moves():
+        if not chessboard.is_in_check(chessboard.player_turn): return '1/2-1/2'
+        return '0-1' if chessboard.player_turn == 'white' else '1-0'
+    if chessboard.halfmove_clock >= 100 or chessboard.repetitions.get(chessboard.key, 0) >= 3:
+        return '1/2-1/2'
+    return '*'
+
+
+def movetext(fen, moves):
+    '''
+        Yield the movetext tokens (move numbers and SAN) of `moves`
+        played from `fen`
+    '''
+    chessboard = board.Board(fen)
+    for number, move in enumerate(moves):
+        if chessboard.player_turn == 'white':
+            yield '%d.' % chessboard.fullmove_number
+        elif not number:
+            yield '%d...' % chessboard.fullmove_number
+        yield san(chessboard, move)
+        chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+
+
+def _wrap(tokens):
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            yield line
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    if line: yield line
+
+
+def write_game(stream, chessboard, tags=None, outcome=None):
+    '''
+        Write the game played on `chessboard` (its starting position and
+        move log) to `stream` as one PGN game. `outcome` defaults to
+        the result of the final position.
+    '''
+    if outcome is None: outcome = result(chessboard)
+    tags = dict(tags or {})
+    tags['Result'] = outcome
+    tags.setdefault('SetUp', '1')
+    tags.setdefault('FEN', chessboard.start_fen)
+
+    lines = []
+    for name in SEVEN_TAG_ROSTER + tuple(name for name in tags if name not in SEVEN_TAG_ROSTER):
+        value = tags.get(name, '?')
+        lines.append('[%s "%s"]' % (name, value.replace('\\', '\\\\').replace('"', '\\"')))
+    lines.append('')
+    tokens = list(movetext(chessboard.start_fen, chessboard.history()))
+    lines.extend(_wrap(tokens + [outcome]))
+    stream.write('\n'.join(lines) + '\n\n')
+
+
+def _tokens(text):
+    '''
+        Main line tokens of a game's movetext, without comments,
+        variations, NAGs and move numbers
+    '''
+    depth = 0
+    for token in TOKEN_REGEX.findall(text):
+        if token == '(': depth += 1
+        elif token == ')': depth -= 1
+        elif depth or token[0] in '{;$' or MOVE_NUMBER_REGEX.match(token): continue
+        else:
+            # "12.e4" has no space after the number
+            yield token.rpartition('.')[2] if token[0].isdigit() and '.' in token else token
+
+
+def _game(tags, text):
+    moves, outcome = [], '*'
+    for token in _tokens(text):
+        if token in RESULTS: outcome = token
+        else: moves.append(token)
+    return Game(tags, moves, tags.get('Result', outcome) if outcome == '*' else outcome)
+
+
+def read_games(stream):
+    '''
+        Yield every Game in a PGN stream, reading one game at a time
+    '''
+    tags, text, in_moves = {}, [], False
+    for line in stream:
+        stripped = line.strip()
+        if stripped.startswith('%'): continue  # escape line
+        match = TAG_REGEX.match(stripped)
+        if match and (in_moves or not text):
+            if in_moves:
+                yield _game(tags, ''.join(text))
+                tags, text, in_moves = {}, [], False
+            tags[match.group(1)] = re.sub(r'\\(.)', r'\1', match.group(2))
+        elif stripped:
+            in_moves = True
+            text.append(line)
+    if tags or text:
+        yield _game(tags, ''.join(text))
+
+
+def replay(game):
+    '''
+        Return a Board with `game` played out, raising PGNError at the
+        first move that is not legal
+    '''
+    chessboard = board.Board(game.tags.get('FEN', board.FEN_STARTING))
+    for text in game.moves:
+        move = parse_san(chessboard, text)
+        chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+    return chessboard
+
+
+def check_game(game):
+    '''
+        Replay `game` and summarise it as a plain dict
+    '''
+    summary = {'moves': len(game.moves), 'result': game.result}
+    for name in ('White', 'Black'):
+        if name in game.tags: summary[name.lower()] = game.tags[name]
+    try:
+        summary['fen'] = replay(game).export()
+    except board.ChessError as error:
+        summary['error'] = '%s %s' % (error.__class__.__name__, error)
+    return summary
+
+
+def _check_chunk(games):
+    return [check_game(game) for game in games]
+
+
+def validate(games, workers=None, chunk_size=64):
+    '''
+        Yield check_game(game) for every game, in order. With more than
+        one worker the games are replayed in worker processes,
+        `chunk_size` at a time.
+    '''
+    if not workers or workers < 2:
+        for game in games: yield check_game(game)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        chunks = parallel.chunked(games, chunk_size)
+        for results in parallel.imap_bounded(executor, _check_chunk, chunks, 2 * workers):
+            for summary in results:
+                yield summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay and check the games of PGN files')
+    parser.add_argument('files', nargs='*', help='input files (default: stdin)')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes')
+    args = parser.parse_args(argv)
+
+    def games():
+        if not args.files:
+            for game in read_games(sys.stdin): yield game
+        for name in args.files:
+            with open(name) as stream:
+                for game in read_games(stream): yield game
+
+    failed = 0
+    for number, summary in enumerate(validate(games(), args.workers), 1):
+        summary['game'] = number
+        failed += 'error' in summary
+        sys.stdout.write(json.dumps(summary, ensure_ascii=False) + '\n')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
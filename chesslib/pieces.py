@@ -1,3 +1,4 @@
+from . import coords
 from . import pieces
 import sys
 
@@ -24,58 +25,90 @@ def piece(piece, color='white'):
     return module.__dict__[piece](color)
 
 
-class Piece(object):
-    __slots__ = ('abbriviation', 'color')
+# Precomputed move tables, squares are indexed row * 8 + column (A1 = 0)
+
+ORTHOGONAL = ((-1,0),(0,-1),(0,1),(1,0))
+DIAGONAL   = ((-1,-1),(-1,1),(1,-1),(1,1))
+
+
+def _ray(index, x, y, distance=7):
+    row, col = coords.ROW_COLS[index]
+    result = []
+    for step in range(1, distance+1):
+        dest_row, dest_col = row + step*x, col + step*y
+        if not (0 <= dest_row < 8 and 0 <= dest_col < 8): break
+        result.append(dest_row * 8 + dest_col)
+    return tuple(result)
+
+
+# ROOK_RAYS[square] -> the four rays (nearest square first) a rook slides along
+ROOK_RAYS = tuple(tuple(ray for ray in (_ray(index, x, y) for x, y in ORTHOGONAL) if ray)
+                  for index in range(64))
+
+# KING_MOVES[square] -> the neighbouring squares
+KING_MOVES = tuple(tuple(ray[0] for ray in (_ray(index, x, y, 1) for x, y in DIAGONAL + ORTHOGONAL) if ray)
+                   for index in range(64))
+
+
+def _pawn_tables(homerow, direction):
+    pushes, attacks = [], []
+    for index in range(64):
+        forward = _ray(index, direction, 0, 2 if index // 8 == homerow else 1)
+        pushes.append(forward)
+        attacks.append(tuple(ray[0] for ray in (_ray(index, direction, a, 1) for a in (-1, 1)) if ray))
+    return tuple(pushes), tuple(attacks)
+
 
-    def __init__(self, color):
-        if color == 'white':
-            self.abbreviation = self.abbreviation.upper()
-        elif color == 'black':
-            self.abbreviation = self.abbreviation.lower()
+# PAWN_PUSHES[color][square] -> single (and double from the home row) push squares
+# PAWN_ATTACKS[color][square] -> the diagonal capture squares
+PAWN_PUSHES, PAWN_ATTACKS = {}, {}
+PAWN_PUSHES['white'], PAWN_ATTACKS['white'] = _pawn_tables(1, 1)
+PAWN_PUSHES['black'], PAWN_ATTACKS['black'] = _pawn_tables(6, -1)
 
-        try:
-            self.color = color
-        except KeyError:
-            raise InvalidColor
+
+class Piece(object):
+    '''
+        Pieces are immutable flyweights: Rook('white') always returns the
+        same object, and a piece knows nothing about the board it is on.
+    '''
+    __slots__ = ('abbreviation', 'color')
+    instances = {}
+
+    def __new__(cls, color):
+        instance = Piece.instances.get((cls, color))
+        if instance is None:
+            if color == 'white': abbreviation = cls.letter.upper()
+            elif color == 'black': abbreviation = cls.letter.lower()
+            else: raise InvalidColor(color)
+            instance = object.__new__(cls)
+            object.__setattr__(instance, 'abbreviation', abbreviation)
+            object.__setattr__(instance, 'color', color)
+            Piece.instances[(cls, color)] = instance
+        return instance
+
+    def __setattr__(self, name, value):
+        raise AttributeError("pieces are immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (self.__class__, (self.color,))
 
     @property
     def name(self):
         return self.__class__.__name__
 
-    def place(self, board):
-        ''' Keep a reference to the board '''
-        self.board = board
-
-    def possible_moves(self, position, orthogonal, diagonal, distance):
-        board = self.board
-        legal_moves = []
-        orth  = ((-1,0),(0,-1),(0,1),(1,0))
-        diag  = ((-1,-1),(-1,1),(1,-1),(1,1))
-        piece = self
-
-        from_ = board.number_notation(position)
-        if orthogonal and diagonal:
-            directions = diag+orth
-        elif diagonal:
-            directions = diag
-        elif orthogonal:
-            directions = orth
-
-        for x,y in directions:
-            collision = False
-            for step in range(1, distance+1):
-                if collision: break
-                dest = from_[0]+step*x, from_[1]+step*y
-                if self.board.letter_notation(dest) not in board.occupied('white') + board.occupied('black'):
-                    legal_moves.append(dest)
-                elif self.board.letter_notation(dest) in board.occupied(piece.color):
-                    collision = True
-                else:
-                    legal_moves.append(dest)
-                    collision = True
-
-        legal_moves = list(filter(board.is_in_bounds, legal_moves))
-        return list(map(board.letter_notation, legal_moves))
+    def targets(self, board, index):
+        ''' Yield the square indices the piece on `index` can move to '''
+        raise NotImplementedError
+
+    def possible_moves(self, board, position):
+        names = coords.NAMES
+        return [names[dest] for dest in self.targets(board, coords.index(position))]
 
     def __str__(self):
         return self.abbreviation
@@ -85,66 +118,52 @@ class Piece(object):
 
 
 class Pawn(Piece):
-    abbreviation = 'p'
+    __slots__ = ()
+    letter = 'p'
 
-    def possible_moves(self, position):
-        board = self.board
-        position = position.upper()
-        piece = self
-        if self.color == 'white':
-            homerow, direction, enemy = 1, 1, 'black'
-        else:
-            homerow, direction, enemy = 6, -1, 'white'
-
-        legal_moves = []
+    def targets(self, board, index):
+        squares = board.squares
 
         # Moving
-
-        blocked = board.occupied('white') + board.occupied('black')
-        from_   = board.number_notation(position)
-        forward = from_[0] + direction, from_[1]
-
-        # Can we move forward?
-        if board.letter_notation(forward) not in blocked:
-            legal_moves.append(forward)
-            if from_[0] == homerow:
-                # If pawn in starting position we can do a double move
-                double_forward = (forward[0] + direction, forward[1])
-                if board.letter_notation(double_forward) not in blocked:
-                    legal_moves.append(double_forward)
+        for dest in PAWN_PUSHES[self.color][index]:
+            if squares[dest] is not None: break
+            yield dest
 
         # Attacking
-        for a in range(-1, 2, 2):
-            attack = from_[0] + direction, from_[1] + a
-            if board.letter_notation(attack) in board.occupied(enemy):
-                legal_moves.append(attack)
-
-        legal_moves = list(filter(board.is_in_bounds, legal_moves))
-        return list(map(board.letter_notation, legal_moves))
+        for dest in PAWN_ATTACKS[self.color][index]:
+            target = squares[dest]
+            if target is not None and target.color != self.color:
+                yield dest
 
 
 class Rook(Piece):
-    abbreviation = 'r'
-
-    def __init__(self, color):
-        Piece.__init__(self, color)
-
-    def possible_moves(self,position):
-        position = position.upper()
-        return super(Rook, self).possible_moves(position, True, False, 8)
+    __slots__ = ()
+    letter = 'r'
+
+    def targets(self, board, index):
+        squares = board.squares
+        for ray in ROOK_RAYS[index]:
+            for dest in ray:
+                target = squares[dest]
+                if target is None:
+                    yield dest
+                    continue
+                if target.color != self.color:
+                    yield dest
+                break
 
 
 class King(Piece):
-    abbreviation = 'k'
+    __slots__ = ()
+    letter = 'k'
     move_length = 1
-    def __init__(self, color):
-        Piece.__init__(self, color)
-        
-    def possible_moves(self,position):
-        position = position.upper()
-        out = super(King, self).possible_moves(position, True, True, 1)
-
-        return out
+
+    def targets(self, board, index):
+        squares = board.squares
+        for dest in KING_MOVES[index]:
+            target = squares[dest]
+            if target is None or target.color != self.color:
+                yield dest
 
 
 Pieces = {
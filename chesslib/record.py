@@ -0,0 +1,194 @@
+'''
+    Binary game record
+
+    Many games in one append-only file. A game is a marker word, its
+    starting FEN and then one 16-bit little-endian word per move:
+
+        bits  0-5   from square index
+        bits  6-11  to square index
+        bits 12-13  promotion, an index into PROMOTIONS
+
+    Move words never reach 0xFFFF, which marks the start of a game:
+
+        0xFFFF, FEN length (16 bits), FEN bytes padded to an even length
+
+    A side file, `path`.idx, holds the file offset of every game as
+    64-bit integers so game N is one seek away. It is rebuilt by
+    scanning the record when it is missing or points past the end.
+
+        with GameRecord('games.clgr') as games:
+            games.follow(chessboard)   # every move played is appended
+            ...
+            fen, moves = games[0]
+            chessboard = games.replay(0)
+'''
+from array import array
+import os
+import struct
+import sys
+
+from . import board
+
+
+MAGIC = b'CLGR\x01\x00'
+GAME_MARKER = 0xFFFF
+PROMOTIONS = (None, 'R', 'K', 'P')
+PROMOTION_CODES = dict((letter, code) for code, letter in enumerate(PROMOTIONS))
+
+_word = struct.Struct('<H')
+
+
+class RecordError(board.ChessError): pass
+
+
+def encode_move(move):
+    return move.from_ | move.to << 6 | PROMOTION_CODES[move.promotion] << 12
+
+
+def decode_move(word):
+    return board.Move(word & 63, word >> 6 & 63, PROMOTIONS[word >> 12])
+
+
+def _words(data):
+    words = array('H', data)
+    if sys.byteorder == 'big': words.byteswap()
+    return words
+
+
+class GameRecord(object):
+    '''
+        A game record file opened for appending and random access, see
+        the module docstring for the format. Only one GameRecord should
+        write to a file at a time.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.stream = open(path, 'a+b')
+        self.stream.seek(0, os.SEEK_END)
+        if self.stream.tell() == 0:
+            self.stream.write(MAGIC)
+        else:
+            self.stream.seek(0)
+            if self.stream.read(len(MAGIC)) != MAGIC: raise RecordError(path)
+        self.offsets = self._read_index()
+        self.index = open(self.index_path, 'ab')
+        self.board = None
+
+    def _read_index(self):
+        size = os.path.getsize(self.path)
+        offsets = array('Q')
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as stream:
+                offsets.frombytes(stream.read())
+            if sys.byteorder == 'big': offsets.byteswap()
+            if offsets[-1] < size if offsets else size <= len(MAGIC):
+                return offsets
+        offsets = self._scan()
+        with open(self.index_path, 'wb') as stream:
+            self._write_offsets(stream, offsets)
+        return offsets
+
+    def _scan(self):
+        ''' Find the offset of every game by walking the whole file '''
+        self.stream.seek(0)
+        data = self.stream.read()
+        offsets = array('Q')
+        position = len(MAGIC)
+        while position + 2 <= len(data):
+            word, = _word.unpack_from(data, position)
+            if word == GAME_MARKER:
+                offsets.append(position)
+                length, = _word.unpack_from(data, position + 2)
+                position += 4 + length + (length & 1)
+            else:
+                position += 2
+        return offsets
+
+    @staticmethod
+    def _write_offsets(stream, offsets):
+        if sys.byteorder == 'big':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+        offsets.tofile(stream)
+
+    def start_game(self, fen):
+        '''
+            Begin a new game from `fen`, later append() calls add its moves
+        '''
+        fen = ' '.join(fen.split()).encode('ascii')
+        self.stream.seek(0, os.SEEK_END)
+        offset = self.stream.tell()
+        self.stream.write(_word.pack(GAME_MARKER) + _word.pack(len(fen)) + fen +
+                          b'\0' * (len(fen) & 1))
+        self.offsets.append(offset)
+        self._write_offsets(self.index, array('Q', [offset]))
+        self.index.flush()
+
+    def append(self, move):
+        self.stream.write(_word.pack(encode_move(move)))
+
+    def write_game(self, fen, moves):
+        self.start_game(fen)
+        words = array('H', [encode_move(move) for move in moves])
+        if sys.byteorder == 'big': words.byteswap()
+        self.stream.write(words.tobytes())
+
+    def follow(self, chessboard):
+        '''
+            Record the game on `chessboard` so far, and every move
+            later played with chessboard.move()
+        '''
+        self.write_game(chessboard.start_fen, chessboard.history())
+        chessboard.recorder = self
+        self.board = chessboard
+
+    def flush(self):
+        self.stream.flush()
+        self.index.flush()
+
+    def close(self):
+        if self.board is not None and self.board.recorder is self:
+            self.board.recorder = None
+        self.stream.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, number):
+        '''
+            Return (starting FEN, list of Moves) of game `number`
+        '''
+        number = range(len(self.offsets))[number]
+        start = self.offsets[number]
+        end = self.offsets[number + 1] if number + 1 < len(self.offsets) else None
+        self.stream.flush()
+        self.stream.seek(start)
+        data = self.stream.read() if end is None else self.stream.read(end - start)
+        length, = _word.unpack_from(data, 2)
+        fen = data[4:4 + length].decode('ascii')
+        moves = _words(data[4 + length + (length & 1):])
+        return fen, [decode_move(word) for word in moves]
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self[number]
+
+    def replay(self, number):
+        '''
+            Return a Board with game `number` played out. Moves are
+            trusted and made without validation.
+        '''
+        fen, moves = self[number]
+        chessboard = board.Board(fen)
+        for move in moves:
+            chessboard.make_move(move.from_, move.to, move.promotion or 'r')
+        return chessboard
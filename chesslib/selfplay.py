@@ -0,0 +1,138 @@
+'''
+    Headless self-play
+
+    Plays games from a position through the Board API alone, with random
+    or engine moves, and reports throughput and how the games ended:
+
+        python -m chesslib.selfplay --games 1000 --workers 4
+        python -m chesslib.selfplay --games 20 --engine --depth 2
+
+    Exceptions other than the game ending are counted as crashes, with
+    the position and move that caused them, instead of stopping the run.
+'''
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+import random
+import time
+
+from . import board
+from . import engine
+from . import parallel
+
+
+MAX_MOVES = 500  # plies before a game is cut off
+
+# Draw messages raised by Board.move -> termination reason
+DRAWS = {
+    'stalemate': 'stalemate',
+    'threefold repetition': 'repetition',
+    'fifty-move rule': 'fifty-move',
+}
+
+
+def play_game(fen=board.FEN_STARTING, seed=0, depth=None, max_moves=MAX_MOVES):
+    '''
+        Play one game from `fen` and return {'moves': plies, 'result':
+        reason}. Moves are random (seeded by `seed`) or, with `depth`,
+        chosen by the engine searching that deep.
+    '''
+    chessboard = board.Board(fen)
+    chooser = random.Random(seed)
+    searcher = engine.Engine(1 << 12) if depth else None
+    limit = engine.Limit(depth=depth)
+
+    for ply in range(max_moves):
+        if searcher is not None:
+            move = searcher.best_move(chessboard, limit)
+        else:
+            moves = chessboard.legal_moves()
+            move = chooser.choice(moves) if moves else None
+        if move is None:
+            # only reachable when `fen` itself is mate or stalemate
+            mate = chessboard.is_in_check(chessboard.player_turn)
+            return {'moves': ply, 'result': 'mate' if mate else 'stalemate'}
+        try:
+            chessboard.move(board.SQUARES[move.from_], board.SQUARES[move.to],
+                            move.promotion or 'r')
+        except board.CheckMate:
+            return {'moves': ply + 1, 'result': 'mate'}
+        except board.Draw as draw:
+            return {'moves': ply + 1, 'result': DRAWS.get(str(draw), str(draw))}
+        except Exception as error:
+            return {'moves': ply, 'result': 'crash', 'fen': chessboard.export(),
+                    'move': str(move), 'error': repr(error)}
+    return {'moves': max_moves, 'result': 'move limit'}
+
+
+def _play_chunk(fen, depth, max_moves, seeds):
+    return [play_game(fen, seed, depth, max_moves) for seed in seeds]
+
+
+def run(games, fen=board.FEN_STARTING, depth=None, workers=1, seed=0,
+        max_moves=MAX_MOVES, chunk_size=16):
+    '''
+        Play `games` games, game n seeded with `seed` + n, and yield
+        their results in order
+    '''
+    seeds = range(seed, seed + games)
+    if workers < 2:
+        for game_seed in seeds:
+            yield play_game(fen, game_seed, depth, max_moves)
+        return
+    play = partial(_play_chunk, fen, depth, max_moves)
+    with ProcessPoolExecutor(workers) as executor:
+        for results in parallel.imap_bounded(executor, play,
+                                             parallel.chunked(seeds, chunk_size), 2 * workers):
+            for result in results:
+                yield result
+
+
+def report(results, seconds):
+    '''
+        Summary of a run as a dict of plain numbers
+    '''
+    games = len(results)
+    moves = sum(result['moves'] for result in results)
+    return {
+        'games': games,
+        'moves': moves,
+        'seconds': seconds,
+        'games_per_second': games / seconds if seconds else 0.0,
+        'moves_per_second': moves / seconds if seconds else 0.0,
+        'average_length': moves / games if games else 0.0,
+        'results': dict(Counter(result['result'] for result in results)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play games headless and report throughput')
+    parser.add_argument('--games', type=int, default=100, help='number of games')
+    parser.add_argument('--fen', default=board.FEN_STARTING, help='starting position')
+    parser.add_argument('--engine', action='store_true', help='let the engine choose the moves')
+    parser.add_argument('--depth', type=int, default=2, help='engine search depth')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max-moves', type=int, default=MAX_MOVES, help='plies before a game is cut off')
+    args = parser.parse_args(argv)
+
+    depth = args.depth if args.engine else None
+    start = time.perf_counter()
+    results = list(run(args.games, args.fen, depth, args.workers, args.seed, args.max_moves))
+    summary = report(results, time.perf_counter() - start)
+
+    print('%d games, %d moves in %.2f s' % (summary['games'], summary['moves'], summary['seconds']))
+    print('%.1f games/s, %.0f moves/s, %.1f moves per game' % (
+        summary['games_per_second'], summary['moves_per_second'], summary['average_length']))
+    for reason, count in sorted(summary['results'].items(), key=lambda item: -item[1]):
+        print('%-12s %d' % (reason, count))
+    for number, result in enumerate(results):
+        if result['result'] == 'crash':
+            print('game %d crashed at %s playing %s: %s' % (
+                args.seed + number, result['fen'], result['move'], result['error']))
+    return 1 if summary['results'].get('crash') else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
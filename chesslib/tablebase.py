@@ -0,0 +1,451 @@
+'''
+    Tablebase
+
+    Retrograde endgame tables for the material chesslib supports (kings,
+    rooks and pawns; pawns promote to rooks).
+
+    A table covers one material signature such as 'KRvK' or 'KRvKP', the
+    first side being the stronger one. Positions with the colors swapped
+    are probed through the mirrored table. Each file holds a 16 byte
+    header followed by one byte per position, addressed by
+
+        index = ((side * 64 + square_0) * 64 + square_1) * 64 ...
+
+    with side 0 for white to move and the pieces in signature order. A
+    byte of 0 is a draw (or an impossible position), otherwise it is the
+    distance to mate in plies plus one: odd distances are wins for the
+    side to move, even ones are losses.
+
+    python -m chesslib.tablebase generate KRvK KPvK KRvKP
+    python -m chesslib.tablebase probe "8/8/8/4k3/8/8/8/R3K3 w - - 0 1"
+'''
+from array import array
+from collections import defaultdict
+from itertools import product
+import argparse
+import mmap
+import os
+
+from . import board
+from . import pieces
+
+
+DEFAULT_DIRECTORY = 'tables'
+SUFFIX = '.cltb'
+MAGIC = b'CLTB\x01'
+HEADER_SIZE = 16
+
+PIECE_ORDER = 'KRPkrp'
+STRENGTH = {'K': 0, 'R': 5, 'P': 1}
+
+INVALID = 255      # counts: not a legal position
+CANNOT_LOSE = 255  # floors: an escape to a draw or a win exists
+MAX_DTM = 254
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+
+class TablebaseError(board.ChessError): pass
+class MissingTable(TablebaseError): pass
+
+
+def _between():
+    table = [[None] * 64 for square in range(64)]
+    for square in range(64):
+        for ray in pieces.ROOK_RAYS[square]:
+            for step, dest in enumerate(ray):
+                table[square][dest] = ray[:step]
+    return tuple(tuple(row) for row in table)
+
+
+# BETWEEN[a][b] -> squares strictly between a and b on a rank or file,
+# None if they are not aligned
+BETWEEN = _between()
+KING_SETS = tuple(frozenset(moves) for moves in pieces.KING_MOVES)
+
+
+def letters(signature):
+    '''
+        'KRvKP' -> ('K', 'R', 'k', 'p')
+    '''
+    white, black = signature.split('v')
+    return tuple(white) + tuple(black.lower())
+
+
+def canonical(letters_, squares, white_to_move):
+    '''
+        Return (signature, squares, white_to_move) of the table that holds
+        the given position, mirroring it if black is the stronger side
+    '''
+    pairs = sorted(zip(letters_, squares), key=lambda pair: PIECE_ORDER.index(pair[0]))
+    white = ''.join(letter for letter, square in pairs if letter.isupper())
+    black = ''.join(letter.upper() for letter, square in pairs if letter.islower())
+    strength = lambda side: (sum(STRENGTH[letter] for letter in side), len(side), side)
+    if strength(black) > strength(white):
+        pairs = sorted(((letter.swapcase(), square ^ 56) for letter, square in pairs),
+                       key=lambda pair: PIECE_ORDER.index(pair[0]))
+        white, black = black, white
+        white_to_move = not white_to_move
+    return white + 'v' + black, tuple(square for letter, square in pairs), white_to_move
+
+
+def position_index(squares, white_to_move):
+    index = 0 if white_to_move else 1
+    for square in squares:
+        index = index * 64 + square
+    return index
+
+
+def decode_index(index, count):
+    squares = []
+    for slot in range(count):
+        index, square = divmod(index, 64)
+        squares.append(square)
+    return not index, squares[::-1]
+
+
+def dependencies(signature):
+    '''
+        Signatures reachable from `signature` by a capture or a promotion
+    '''
+    letters_ = letters(signature)
+    result = set()
+    others = [slot for slot, letter in enumerate(letters_) if letter not in 'Kk']
+    for pawn in [None] + [slot for slot in others if letters_[slot] in 'Pp']:
+        promoted = list(letters_)
+        if pawn is not None: promoted[pawn] = 'R' if letters_[pawn] == 'P' else 'r'
+        for captured in [None] + [slot for slot in others if slot != pawn]:
+            if pawn is None and captured is None: continue
+            remaining = [letter for slot, letter in enumerate(promoted) if slot != captured]
+            result.add(canonical(remaining, range(len(remaining)), True)[0])
+    return result
+
+
+def _attacked(target, attackers, occupied):
+    '''
+        Is `target` attacked by any of `attackers`, a list of (letter, square)
+    '''
+    for letter, square in attackers:
+        kind = letter.upper()
+        if kind == 'K':
+            if target in KING_SETS[square]: return True
+        elif kind == 'R':
+            line = BETWEEN[square][target]
+            if line is not None and not occupied.intersection(line): return True
+        elif target in pieces.PAWN_ATTACKS['white' if letter == 'P' else 'black'][square]:
+            return True
+    return False
+
+
+def _targets(letter, square, occupied):
+    kind = letter.upper()
+    if kind == 'K':
+        return pieces.KING_MOVES[square]
+    if kind == 'R':
+        result = []
+        for ray in pieces.ROOK_RAYS[square]:
+            for dest in ray:
+                result.append(dest)
+                if dest in occupied: break
+        return result
+    color = 'white' if letter == 'P' else 'black'
+    result = []
+    for dest in pieces.PAWN_PUSHES[color][square]:
+        if dest in occupied: break
+        result.append(dest)
+    return result + [dest for dest in pieces.PAWN_ATTACKS[color][square] if dest in occupied]
+
+
+def _legal_moves(letters_, squares, white_to_move):
+    '''
+        Yield (slot, dest, captured_slot, promotes) for the side to move
+        in a raw position, or nothing if the position is not legal
+    '''
+    occupied = set(squares)
+    own = [slot for slot, letter in enumerate(letters_) if letter.isupper() == white_to_move]
+    king = [slot for slot in own if letters_[slot] in 'Kk'][0]
+    for slot in own:
+        letter, square = letters_[slot], squares[slot]
+        for dest in _targets(letter, square, occupied):
+            captured = None
+            if dest in occupied:
+                captured = squares.index(dest)
+                if letters_[captured].isupper() == white_to_move: continue
+                if letters_[captured] in 'Kk': continue
+            promotes = letter in 'Pp' and dest // 8 in (0, 7)
+            after = occupied - set([square])
+            after.add(dest)
+            king_square = dest if slot == king else squares[king]
+            attackers = [(letters_[other], squares[other]) for other in range(len(squares))
+                         if other not in own and other != captured]
+            if not _attacked(king_square, attackers, after):
+                yield slot, dest, captured, promotes
+
+
+def _is_valid(letters_, squares, white_to_move):
+    if len(set(squares)) != len(squares): return False
+    for letter, square in zip(letters_, squares):
+        if letter in 'Pp' and square // 8 in (0, 7): return False
+    occupied = set(squares)
+    for letter, square in zip(letters_, squares):
+        if letter in 'Kk' and letter.isupper() != white_to_move:
+            attackers = [(other, where) for other, where in zip(letters_, squares)
+                         if other.isupper() == white_to_move]
+            return not _attacked(square, attackers, occupied)
+    return True
+
+
+def _in_check(letters_, squares, white_to_move):
+    occupied = set(squares)
+    for letter, square in zip(letters_, squares):
+        if letter in 'Kk' and letter.isupper() == white_to_move:
+            attackers = [(other, where) for other, where in zip(letters_, squares)
+                         if other.isupper() != white_to_move]
+            return _attacked(square, attackers, occupied)
+    return False
+
+
+class Table(object):
+    '''
+        One memory-mapped table file, table[index] is the stored byte
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self.mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self.mmap[:HEADER_SIZE]
+        if not header.startswith(MAGIC):
+            raise TablebaseError("not a tablebase file: " + path)
+        self.signature = header[len(MAGIC):].rstrip(b'\0').decode('ascii')
+
+    def __getitem__(self, index):
+        return self.mmap[HEADER_SIZE + index]
+
+    def close(self):
+        self.mmap.close()
+
+
+class Tablebase(object):
+    '''
+        The tables found in `directory`, opened lazily
+    '''
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables = {}
+
+    def path(self, signature):
+        return os.path.join(self.directory, signature + SUFFIX)
+
+    def table(self, signature):
+        if signature not in self.tables:
+            path = self.path(signature)
+            if not os.path.exists(path): raise MissingTable(signature)
+            self.tables[signature] = Table(path)
+        return self.tables[signature]
+
+    def value(self, letters_, squares, white_to_move):
+        '''
+            Stored byte for a raw position of any color arrangement
+        '''
+        signature, squares, white_to_move = canonical(letters_, squares, white_to_move)
+        if signature == 'KvK': return 0
+        return self.table(signature)[position_index(squares, white_to_move)]
+
+    def probe(self, chessboard):
+        '''
+            Return (wdl, dtm) for the side to move: wdl is WIN, DRAW or
+            LOSS, dtm the distance to mate in plies (None for a draw)
+        '''
+        letters_, squares = [], []
+        for index in sorted(chessboard.occupancy['white'] | chessboard.occupancy['black']):
+            letters_.append(chessboard.squares[index].abbreviation)
+            squares.append(index)
+        value = self.value(letters_, squares, chessboard.player_turn == 'white')
+        if not value: return DRAW, None
+        dtm = value - 1
+        return (WIN if dtm % 2 else LOSS), dtm
+
+    def close(self):
+        for table in self.tables.values(): table.close()
+        self.tables = {}
+
+
+_default = None
+
+
+def probe(chessboard):
+    '''
+        Probe the tables in DEFAULT_DIRECTORY, see Tablebase.probe
+    '''
+    global _default
+    if _default is None: _default = Tablebase()
+    return _default.probe(chessboard)
+
+
+def scan(signature, block, directory=DEFAULT_DIRECTORY):
+    '''
+        Forward pass over one block of positions (side to move and first
+        piece square fixed). Returns (block, counts, floors, seeds):
+        the number of moves staying in the table per position (INVALID
+        for illegal positions), the longest loss forced by leaving the
+        table (CANNOT_LOSE if leaving can draw or win) and the
+        (ply, offset) pairs already known to be decided at that ply.
+    '''
+    letters_ = letters(signature)
+    white_to_move, first = block < 64, block % 64
+    size = 64 ** (len(letters_) - 1)
+    counts, floors, seeds = bytearray(size), bytearray(size), []
+    tablebase = Tablebase(directory)
+
+    for offset, rest in enumerate(product(range(64), repeat=len(letters_) - 1)):
+        squares = (first,) + rest
+        if not _is_valid(letters_, squares, white_to_move):
+            counts[offset] = INVALID
+            continue
+        count, moves, win, loss, draw = 0, 0, None, 0, False
+        for slot, dest, captured, promotes in _legal_moves(letters_, squares, white_to_move):
+            moves += 1
+            if captured is None and not promotes:
+                count += 1
+                continue
+            child_letters = list(letters_)
+            child_squares = list(squares)
+            child_squares[slot] = dest
+            if promotes: child_letters[slot] = 'R' if white_to_move else 'r'
+            if captured is not None:
+                del child_letters[captured], child_squares[captured]
+            value = tablebase.value(child_letters, child_squares, not white_to_move)
+            if not value:
+                draw = True
+            elif value % 2:
+                # the child's side to move is lost in value - 1 plies
+                win = value if win is None else min(win, value)
+            else:
+                loss = max(loss, value)
+        counts[offset] = count
+        if not moves:
+            if _in_check(letters_, squares, white_to_move): seeds.append((0, offset))
+            else: floors[offset] = CANNOT_LOSE
+        elif win is not None or draw:
+            floors[offset] = CANNOT_LOSE
+            if win is not None: seeds.append((win, offset))
+        else:
+            floors[offset] = loss
+            if not count: seeds.append((loss, offset))
+    tablebase.close()
+    return block, counts, floors, seeds
+
+
+def _unmoves(letters_, squares, white_to_move):
+    '''
+        Yield (slot, origin) for every non-capturing, non-promoting move
+        the side not to move could have just played
+    '''
+    occupied = set(squares)
+    for slot, letter in enumerate(letters_):
+        if letter.isupper() == white_to_move: continue
+        square, kind = squares[slot], letter.upper()
+        if kind == 'K':
+            for origin in pieces.KING_MOVES[square]:
+                if origin not in occupied: yield slot, origin
+        elif kind == 'R':
+            for ray in pieces.ROOK_RAYS[square]:
+                for origin in ray:
+                    if origin in occupied: break
+                    yield slot, origin
+        else:
+            step = 8 if letter == 'P' else -8
+            origin = square - step
+            if origin in occupied or origin // 8 in (0, 7): continue
+            yield slot, origin
+            if square // 8 == (3 if letter == 'P' else 4) and origin - step not in occupied:
+                yield slot, origin - step
+
+
+def generate(signature, directory=DEFAULT_DIRECTORY, scan_blocks=None):
+    '''
+        Build the table for `signature` (and any missing table it depends
+        on) by retrograde analysis and write it to `directory`.
+        `scan_blocks(signature, blocks, directory)` may be given to run
+        the forward pass elsewhere, it must yield scan() results.
+    '''
+    if scan_blocks is None:
+        scan_blocks = lambda signature, blocks, directory: \
+            (scan(signature, block, directory) for block in blocks)
+    if not os.path.isdir(directory): os.makedirs(directory)
+    for dependency in sorted(dependencies(signature)):
+        if dependency != 'KvK' and not os.path.exists(os.path.join(directory, dependency + SUFFIX)):
+            generate(dependency, directory, scan_blocks)
+
+    letters_ = letters(signature)
+    pieces_count = len(letters_)
+    size = 64 ** (pieces_count - 1)
+    total = 128 * size
+    counts, floors, values = bytearray(total), bytearray(total), bytearray(total)
+    frontier = defaultdict(lambda: array('q'))
+
+    for block, block_counts, block_floors, seeds in scan_blocks(signature, range(128), directory):
+        start = block * size
+        counts[start:start + size] = block_counts
+        floors[start:start + size] = block_floors
+        for ply, offset in seeds:
+            frontier[ply].append(start + offset)
+
+    ply = 0
+    while frontier:
+        if ply > MAX_DTM: raise TablebaseError("distance to mate too long for " + signature)
+        for index in frontier.pop(ply, ()):
+            if values[index]: continue
+            values[index] = ply + 1
+            white_to_move, squares = decode_index(index, pieces_count)
+            for slot, origin in _unmoves(letters_, squares, white_to_move):
+                previous = list(squares)
+                previous[slot] = origin
+                parent = position_index(previous, not white_to_move)
+                if counts[parent] == INVALID or values[parent]: continue
+                if ply % 2 == 0:
+                    # a move into a lost position wins
+                    frontier[ply + 1].append(parent)
+                    continue
+                counts[parent] -= 1
+                if not counts[parent] and floors[parent] != CANNOT_LOSE:
+                    frontier[max(ply + 1, floors[parent])].append(parent)
+        ply += 1
+
+    path = os.path.join(directory, signature + SUFFIX)
+    with open(path + '.tmp', 'wb') as handle:
+        handle.write((MAGIC + signature.encode('ascii')).ljust(HEADER_SIZE, b'\0'))
+        handle.write(values)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Endgame tablebases for chesslib')
+    parser.add_argument('--dir', default=DEFAULT_DIRECTORY)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes for the forward pass (0 = one per core)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('generate', help='build tables')
+    command.add_argument('signatures', nargs='*', default=['KRvK', 'KPvK', 'KRvKP'])
+    command = commands.add_parser('probe', help='look up a position')
+    command.add_argument('fen')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        for signature in args.signatures:
+            if args.workers == 1:
+                print(generate(signature, args.dir))
+            else:
+                from . import parallel
+                print(parallel.generate_tablebase(signature, args.dir, args.workers or None))
+        return 0
+
+    wdl, dtm = Tablebase(args.dir).probe(board.Board(args.fen))
+    print({WIN: 'win', DRAW: 'draw', LOSS: 'loss'}[wdl], '' if dtm is None else dtm)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+'''
+    User accounts
+
+    Passwords are stored as salted PBKDF2 hashes. The iteration count
+    is kept with every account, so raising the cost for new accounts
+    does not lock out old ones.
+
+        store = SQLiteUserStore('users.db')
+        store.register('alice', 'secret')
+        store.authenticate('alice', 'secret')   # True
+'''
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+
+
+DEFAULT_DATABASE = 'users.db'
+DEFAULT_ITERATIONS = 200000
+SALT_SIZE = 16
+HASH_NAME = 'sha256'
+
+
+class UserError(Exception): pass
+class UserExists(UserError): pass
+
+
+def hash_password(password, salt, iterations):
+    return hashlib.pbkdf2_hmac(HASH_NAME, password.encode('UTF-8'), salt, iterations)
+
+
+class UserStore(object):
+    '''
+        Hashes and checks passwords. Subclasses only keep the
+        (salt, hash, iterations) record of every login, by overriding
+        add() and get().
+    '''
+
+    def __init__(self, iterations=DEFAULT_ITERATIONS):
+        self.iterations = iterations
+
+    def register(self, login, password):
+        '''
+            Create an account, raises UserExists if `login` is taken
+        '''
+        salt = os.urandom(SALT_SIZE)
+        self.add(login, salt, hash_password(password, salt, self.iterations), self.iterations)
+
+    def authenticate(self, login, password):
+        record = self.get(login)
+        if record is None: return False
+        salt, digest, iterations = record
+        return hmac.compare_digest(hash_password(password, salt, iterations), digest)
+
+    def add(self, login, salt, digest, iterations):
+        raise NotImplementedError
+
+    def get(self, login):
+        ''' Return (salt, hash, iterations) for `login`, or None '''
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MemoryUserStore(UserStore):
+    ''' Accounts in a dict, for tests and throwaway sessions '''
+
+    def __init__(self, iterations=DEFAULT_ITERATIONS):
+        UserStore.__init__(self, iterations)
+        self.records = {}
+
+    def add(self, login, salt, digest, iterations):
+        if login in self.records: raise UserExists(login)
+        self.records[login] = (salt, digest, iterations)
+
+    def get(self, login):
+        return self.records.get(login)
+
+
+class SQLiteUserStore(UserStore):
+    '''
+        Accounts in an SQLite database, looked up through a unique index
+        on login. The database runs in WAL mode so logins can read while
+        a registration writes.
+    '''
+
+    def __init__(self, path=DEFAULT_DATABASE, iterations=DEFAULT_ITERATIONS):
+        UserStore.__init__(self, iterations)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS users ('
+                                    ' id INTEGER PRIMARY KEY,'
+                                    ' login TEXT NOT NULL,'
+                                    ' salt BLOB NOT NULL,'
+                                    ' hash BLOB NOT NULL,'
+                                    ' iterations INTEGER NOT NULL)')
+            self.connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS users_login ON users (login)')
+
+    def add(self, login, salt, digest, iterations):
+        try:
+            with self.connection:
+                self.connection.execute('INSERT INTO users (login, salt, hash, iterations)'
+                                        ' VALUES (?, ?, ?, ?)', (login, salt, digest, iterations))
+        except sqlite3.IntegrityError:
+            raise UserExists(login)
+
+    def get(self, login):
+        return self.connection.execute('SELECT salt, hash, iterations FROM users WHERE login = ?',
+                                       (login,)).fetchone()
+
+    def close(self):
+        self.connection.close()
+
+
+def migrate_json(store, path):
+    '''
+        Register every account of the old JSON user file (a list of
+        {"login": ..., "password": ...} with both fields base64 encoded)
+        in `store`, then rename the file to `path`.migrated so this only
+        happens once. Logins already in the store are left alone.
+        Returns the number of accounts added.
+    '''
+    with open(path, encoding='UTF-8') as stream:
+        try:
+            records = json.load(stream)
+        except json.JSONDecodeError:
+            records = []
+
+    added = 0
+    for record in records or []:
+        login = base64.b64decode(record['login']).decode('UTF-8')
+        password = base64.b64decode(record['password']).decode('UTF-8')
+        try:
+            store.register(login, password)
+        except UserExists:
+            continue
+        added += 1
+    os.replace(path, path + '.migrated')
+    return added